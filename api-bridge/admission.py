@@ -0,0 +1,251 @@
+"""
+Admission control for API bridge routes
+Per-API-key token-bucket rate limits, in-flight concurrency caps and adaptive load shedding
+"""
+
+import hashlib
+import math
+import time
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+
+class InMemoryAdmissionStore:
+    """
+    Admission state for a single api-bridge instance.
+
+    Keys come from client-supplied API keys, so state is only kept while it
+    matters: buckets are dropped once they have refilled to full and
+    in-flight counters once they are back at zero.
+    """
+
+    def __init__(self, sweep_interval: float = 1.0):
+        # key -> (tokens, last refill timestamp, time the bucket is full again)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._in_flight: Dict[str, int] = {}
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.monotonic()
+
+    async def take_token(self, key: str, rate: float, burst: int) -> float:
+        """Take one token; returns 0 on success or seconds until a token is available"""
+        now = time.monotonic()
+        self._sweep(now)
+        tokens, last, _ = self._buckets.get(key, (float(burst), now, now))
+        tokens = min(float(burst), tokens + (now - last) * rate)
+        wait = 0.0
+        if tokens >= 1.0:
+            tokens -= 1.0
+        else:
+            wait = (1.0 - tokens) / rate
+        self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+        return wait
+
+    def _sweep(self, now: float) -> None:
+        """Forget buckets that have refilled, since a missing bucket starts full"""
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        self._buckets = {key: state for key, state in self._buckets.items() if state[2] > now}
+
+    async def acquire_slot(self, key: str, limit: int) -> bool:
+        count = self._in_flight.get(key, 0)
+        if count >= limit:
+            return False
+        self._in_flight[key] = count + 1
+        return True
+
+    async def release_slot(self, key: str) -> None:
+        count = self._in_flight.pop(key, 0) - 1
+        if count > 0:
+            self._in_flight[key] = count
+
+
+class RedisAdmissionStore:
+    """Admission state shared across api-bridge replicas through Redis"""
+
+    # Refill and take atomically; returns 0 when admitted, else ms until the next token
+    TOKEN_BUCKET_SCRIPT = """
+    local key = KEYS[1]
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + (now - ts) / 1000 * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = math.ceil((1 - tokens) / rate * 1000)
+    end
+    redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000) + 1000)
+    return wait
+    """
+
+    # Increment the in-flight counter unless it is at the limit; returns 1 when admitted
+    ACQUIRE_SLOT_SCRIPT = """
+    local key = KEYS[1]
+    local count = redis.call('INCR', key)
+    if redis.call('TTL', key) < 0 then
+        redis.call('EXPIRE', key, tonumber(ARGV[2]))
+    end
+    if count > tonumber(ARGV[1]) then
+        redis.call('DECR', key)
+        return 0
+    end
+    return 1
+    """
+
+    # Delete the counter once it drains so the next acquire starts a fresh TTL
+    RELEASE_SLOT_SCRIPT = """
+    if redis.call('DECR', KEYS[1]) <= 0 then
+        redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    # In-flight counters expire so a crashed replica cannot leak slots forever.
+    # The TTL is set when a counter is created and not extended by later
+    # acquires, so leaked slots are gone after at most this many seconds.
+    SLOT_TTL_SECONDS = 300
+
+    def __init__(self, url: str, prefix: str = "api-bridge:admission"):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.prefix = prefix
+        self._token_bucket = self.redis.register_script(self.TOKEN_BUCKET_SCRIPT)
+        self._acquire_slot = self.redis.register_script(self.ACQUIRE_SLOT_SCRIPT)
+        self._release_slot = self.redis.register_script(self.RELEASE_SLOT_SCRIPT)
+
+    async def take_token(self, key: str, rate: float, burst: int) -> float:
+        wait_ms = await self._token_bucket(
+            keys=[f"{self.prefix}:bucket:{key}"],
+            args=[rate, burst, int(time.time() * 1000)],
+        )
+        return int(wait_ms) / 1000.0
+
+    async def acquire_slot(self, key: str, limit: int) -> bool:
+        admitted = await self._acquire_slot(
+            keys=[f"{self.prefix}:inflight:{key}"], args=[limit, self.SLOT_TTL_SECONDS]
+        )
+        return int(admitted) == 1
+
+    async def release_slot(self, key: str) -> None:
+        await self._release_slot(keys=[f"{self.prefix}:inflight:{key}"])
+
+
+class AdmissionController:
+    """
+    Admission decisions for (API key, route) pairs.
+
+    Requests are rejected with 429 when the caller exceeds its token-bucket
+    rate or in-flight concurrency, and with 503 when the route's upstream
+    latency (an EWMA over recent requests) is above ``shed_latency_ms``.
+    """
+
+    def __init__(
+        self,
+        store: Any,
+        rate: float = 10.0,
+        burst: int = 20,
+        max_in_flight: int = 8,
+        shed_latency_ms: float = 0.0,
+        route_limits: Optional[Dict[str, Dict[str, float]]] = None,
+        ewma_alpha: float = 0.2,
+    ):
+        self.store = store
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.shed_latency_ms = shed_latency_ms
+        self.route_limits = route_limits or {}
+        self.ewma_alpha = ewma_alpha
+        # Fail at startup rather than with a 500 on every request to a misconfigured route
+        for route in ["default", *self.route_limits]:
+            self._check_limits(route)
+        self.latency_ms: Dict[str, float] = {}
+        self._last_probe: Dict[str, float] = {}
+        self.admitted: Dict[str, int] = defaultdict(int)
+        self.rejected: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    @staticmethod
+    def client_id(api_key: Optional[str]) -> str:
+        """Stable identifier for an API key that never stores the key itself"""
+        if not api_key:
+            return "anonymous"
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+    def _limits(self, route: str) -> Tuple[float, int, int]:
+        limits = self.route_limits.get(route, {})
+        return (
+            float(limits.get("rate", self.rate)),
+            int(limits.get("burst", self.burst)),
+            int(limits.get("max_in_flight", self.max_in_flight)),
+        )
+
+    def _check_limits(self, route: str) -> None:
+        if not isinstance(self.route_limits.get(route, {}), dict):
+            raise ValueError(f"Admission limits for route {route!r} must be an object")
+        rate, burst, max_in_flight = self._limits(route)
+        if rate <= 0 or burst < 1 or max_in_flight < 1:
+            raise ValueError(
+                f"Invalid admission limits for route {route!r}: "
+                "rate must be > 0, burst and max_in_flight >= 1"
+            )
+
+    def _reject(self, route: str, reason: str, status_code: int, retry_after: float):
+        self.rejected[route][reason] += 1
+        raise HTTPException(
+            status_code=status_code,
+            detail=f"Request rejected: {reason}",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    async def acquire(self, route: str, api_key: Optional[str]) -> str:
+        """Admit a request or raise HTTPException; returns the slot key to release"""
+        if self.shed_latency_ms > 0 and self.latency_ms.get(route, 0.0) > self.shed_latency_ms:
+            # Shed everything except one probe per observed round trip so the
+            # latency estimate keeps updating and can recover
+            now = time.monotonic()
+            retry_after = self.latency_ms[route] / 1000.0
+            if now - self._last_probe.get(route, float("-inf")) < retry_after:
+                self._reject(route, "overloaded", 503, retry_after)
+            self._last_probe[route] = now
+
+        rate, burst, max_in_flight = self._limits(route)
+        key = f"{self.client_id(api_key)}:{route}"
+
+        # Check concurrency first so a request rejected for it doesn't spend rate budget
+        if not await self.store.acquire_slot(key, max_in_flight):
+            self._reject(route, "too_many_in_flight", 429, 1.0)
+
+        wait = await self.store.take_token(key, rate, burst)
+        if wait > 0:
+            await self.store.release_slot(key)
+            self._reject(route, "rate_limited", 429, wait)
+
+        self.admitted[route] += 1
+        return key
+
+    async def release(self, key: str, route: str, elapsed_ms: float) -> None:
+        await self.store.release_slot(key)
+        previous = self.latency_ms.get(route)
+        if previous is None:
+            self.latency_ms[route] = elapsed_ms
+        else:
+            self.latency_ms[route] = (
+                self.ewma_alpha * elapsed_ms + (1 - self.ewma_alpha) * previous
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "admitted": dict(self.admitted),
+            "rejected": {route: dict(reasons) for route, reasons in self.rejected.items()},
+            "latency_ms": dict(self.latency_ms),
+            "shed_latency_ms": self.shed_latency_ms,
+        }
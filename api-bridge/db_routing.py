@@ -0,0 +1,200 @@
+"""
+Read/write database routing
+Sends writes to the primary and reads to healthy, caught-up replicas with read-your-writes support
+"""
+
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+LSN_PATTERN = re.compile(r"[0-9A-Fa-f]{1,8}/[0-9A-Fa-f]{1,8}")
+
+
+def parse_lsn(lsn: Optional[str]) -> int:
+    """
+    Convert a Postgres LSN such as ``16/B374D848`` to a comparable integer.
+
+    Raises ``ValueError`` if ``lsn`` is not an LSN.
+    """
+    if not lsn:
+        return 0
+    if not LSN_PATTERN.fullmatch(lsn):
+        raise ValueError(f"Invalid read_after token: {lsn!r}")
+    high, _, low = lsn.partition("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """Whether ``error`` means the server can't be reached, rather than a problem with the query"""
+    from sqlalchemy import exc
+
+    if isinstance(error, OSError):
+        return True
+    if isinstance(error, (exc.OperationalError, exc.InterfaceError)):
+        return True
+    return isinstance(error, exc.DBAPIError) and bool(error.connection_invalidated)
+
+
+class ReplicaState:
+    """Last known health of one read replica"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy = False
+        self.lag_seconds: Optional[float] = None
+        self.replay_lsn = 0
+        self.checked_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "lag_seconds": self.lag_seconds,
+            "replay_lsn": self.replay_lsn,
+            "checked_at": self.checked_at,
+            "error": self.error,
+        }
+
+
+class DatabaseRouter:
+    """
+    Routes queries between a primary and optional read replicas.
+
+    Replicas are health-checked periodically; a replica serves reads only if
+    it answered the last check and its replay lag is within ``max_lag_seconds``.
+    After a write, callers get the primary's WAL position as a read token;
+    reads presenting that token only go to replicas that have replayed past
+    it (read-your-writes), otherwise to the primary.
+    """
+
+    def __init__(
+        self,
+        write_url: str,
+        read_urls: Optional[List[str]] = None,
+        max_lag_seconds: float = 10.0,
+        connect_timeout: int = 5,
+        engine_factory: Optional[Callable[[str], Any]] = None,
+    ):
+        self.write_url = write_url
+        self.read_urls = [url for url in (read_urls or []) if url]
+        self.max_lag_seconds = max_lag_seconds
+        self.connect_timeout = connect_timeout
+        self._engine_factory = engine_factory
+        self._engines: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.replicas = {url: ReplicaState(url) for url in self.read_urls}
+        self.reads = {"primary": 0, "replica": 0, "failover": 0}
+
+    def engine(self, url: str):
+        """One pooled engine per DSN, created on first use"""
+        with self._lock:
+            if url not in self._engines:
+                if self._engine_factory is not None:
+                    self._engines[url] = self._engine_factory(url)
+                else:
+                    from sqlalchemy import create_engine
+
+                    # Fail fast on an unreachable replica so reads can fail over
+                    self._engines[url] = create_engine(
+                        url,
+                        pool_pre_ping=True,
+                        connect_args={"connect_timeout": self.connect_timeout},
+                    )
+            return self._engines[url]
+
+    def writer(self):
+        return self.engine(self.write_url)
+
+    def read_candidates(self, read_after: Optional[str] = None) -> List[str]:
+        """Replica URLs eligible for a read, best first, followed by the primary"""
+        min_lsn = parse_lsn(read_after)
+        eligible = [
+            state for state in self.replicas.values()
+            if state.healthy
+            and state.lag_seconds is not None
+            and state.lag_seconds <= self.max_lag_seconds
+            and state.replay_lsn >= min_lsn
+        ]
+        # Spread load across replicas that are about equally fresh
+        random.shuffle(eligible)
+        eligible.sort(key=lambda state: round(state.lag_seconds or 0.0))
+        return [state.url for state in eligible] + [self.write_url]
+
+    def run_read(self, fn: Callable[[Any], T], read_after: Optional[str] = None) -> T:
+        """
+        Run ``fn(engine)`` on the best replica, failing over to the next one and then the primary.
+
+        Only connection errors fail over; errors in the query itself are raised
+        straight away, so a bad request can't take replicas out of rotation.
+        """
+        candidates = self.read_candidates(read_after)
+        for url in candidates:
+            try:
+                result = fn(self.engine(url))
+            except Exception as e:
+                if url == self.write_url or not is_connection_error(e):
+                    raise
+                self.reads["failover"] += 1
+                self.mark_unhealthy(url, e)
+                continue
+            self.reads["primary" if url == self.write_url else "replica"] += 1
+            return result
+        raise RuntimeError("No database available for reads")
+
+    def write_position(self, conn) -> str:
+        """Primary WAL position after a write, to be passed back as a read token"""
+        from sqlalchemy import text
+
+        return conn.execute(text("SELECT pg_current_wal_lsn()::text AS lsn")).fetchone().lsn
+
+    def mark_unhealthy(self, url: str, error: Exception) -> None:
+        state = self.replicas.get(url)
+        if state is not None:
+            state.healthy = False
+            state.error = str(error)
+
+    def check_replicas(self) -> Dict[str, Dict[str, Any]]:
+        """Refresh lag and replay position for every replica"""
+        from sqlalchemy import text
+
+        for url, state in self.replicas.items():
+            try:
+                with self.engine(url).connect() as conn:
+                    row = conn.execute(text("""
+                        SELECT
+                            pg_is_in_recovery() AS in_recovery,
+                            pg_last_wal_replay_lsn()::text AS replay_lsn,
+                            CASE
+                                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+                            END AS lag_seconds
+                    """)).fetchone()
+                state.healthy = bool(row.in_recovery)
+                state.error = None if row.in_recovery else "not in recovery (promoted?)"
+                state.replay_lsn = parse_lsn(row.replay_lsn)
+                state.lag_seconds = float(row.lag_seconds or 0.0)
+            except Exception as e:
+                state.healthy = False
+                state.error = str(e)
+            state.checked_at = time.time()
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "replicas": {self._redact(url): state.to_dict() for url, state in self.replicas.items()},
+            "max_lag_seconds": self.max_lag_seconds,
+            "reads": dict(self.reads),
+        }
+
+    @staticmethod
+    def _redact(url: str) -> str:
+        """Hide credentials when reporting a DSN"""
+        scheme, sep, rest = url.partition("://")
+        if "@" in rest:
+            rest = rest.split("@", 1)[1]
+        return f"{scheme}{sep}{rest}"
@@ -0,0 +1,177 @@
+"""
+Embedding micro-batcher
+Collects concurrent embedding requests into batches and calls the model once per batch
+"""
+
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+EmbedFn = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+class EmbeddingCache:
+    """Bounded LRU cache of embeddings keyed by a content hash"""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        vector = self._entries.get(key)
+        if vector is not None:
+            self._entries.move_to_end(key)
+        return vector
+
+    def put(self, key: str, vector: List[float]) -> None:
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class EmbeddingBatcher:
+    """
+    Dynamic micro-batcher for a single embedding model.
+
+    Texts submitted by concurrent callers are queued until either
+    ``max_batch_size`` texts are pending or ``max_wait_ms`` has elapsed since
+    the first one arrived. The batch is then embedded with a single call to
+    ``embed_fn`` and the vectors are fanned back out to the waiting callers.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        embed_fn: EmbedFn,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 10.0,
+        cache: Optional[EmbeddingCache] = None,
+    ):
+        self.model = model
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.cache = cache
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: "set[asyncio.Task]" = set()
+        self.batches_sent = 0
+        self.texts_embedded = 0
+        self.cache_hits = 0
+
+    async def embed(self, texts: List[str], use_cache: bool = True) -> List[List[float]]:
+        """Embed texts, sharing model calls with any concurrent callers"""
+        loop = asyncio.get_running_loop()
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        waiting: List[Tuple[int, asyncio.Future]] = []
+
+        for i, text in enumerate(texts):
+            if use_cache and self.cache is not None:
+                cached = self.cache.get(EmbeddingCache.key(self.model, text))
+                if cached is not None:
+                    results[i] = cached
+                    self.cache_hits += 1
+                    continue
+            future = loop.create_future()
+            self._pending.append((text, future))
+            waiting.append((i, future))
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+
+        if self._pending and self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        for i, future in waiting:
+            results[i] = await future
+        return results  # type: ignore[return-value]
+
+    def _flush(self) -> None:
+        """Detach the pending queue and embed it in the background"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._run_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        # Identical texts within a batch are only sent to the model once
+        unique: Dict[str, int] = {}
+        for text, _ in batch:
+            unique.setdefault(text, len(unique))
+        inputs = list(unique)
+
+        try:
+            vectors = await self.embed_fn(inputs)
+            if len(vectors) != len(inputs):
+                raise RuntimeError(
+                    f"Model returned {len(vectors)} embeddings for {len(inputs)} inputs"
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches_sent += 1
+        self.texts_embedded += len(inputs)
+        if self.cache is not None:
+            for text, index in unique.items():
+                self.cache.put(EmbeddingCache.key(self.model, text), vectors[index])
+        for text, future in batch:
+            if not future.done():
+                future.set_result(vectors[unique[text]])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "batches_sent": self.batches_sent,
+            "texts_embedded": self.texts_embedded,
+            "cache_hits": self.cache_hits,
+            "pending": len(self._pending),
+            "avg_batch_size": (
+                self.texts_embedded / self.batches_sent if self.batches_sent else 0.0
+            ),
+        }
+
+
+def ollama_embed_fn(
+    base_url: str,
+    model: str,
+    timeout: float = 60.0,
+    client: Optional[httpx.AsyncClient] = None,
+) -> EmbedFn:
+    """
+    Build an embed function backed by Ollama's batch ``/api/embed`` endpoint.
+
+    Every batch goes through the same ``client`` (created on first use if not
+    given), so connections to Ollama are kept alive between batches.
+    """
+
+    async def embed(texts: List[str]) -> List[List[float]]:
+        nonlocal client
+        if client is None:
+            client = httpx.AsyncClient()
+        response = await client.post(
+            f"{base_url}/api/embed",
+            json={"model": model, "input": texts},
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+    return embed
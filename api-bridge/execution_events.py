@@ -0,0 +1,185 @@
+"""
+Execution status push
+A single shared watcher that turns many client polling loops into one upstream status query
+"""
+
+import asyncio
+import json
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+FetchStatusesFn = Callable[[List[str]], Awaitable[List[Dict[str, Any]]]]
+
+# n8n execution states after which no further updates are sent
+# ("not_found" is ours: the execution never showed up in n8n's database)
+TERMINAL_STATUSES = {"success", "error", "crashed", "canceled", "not_found"}
+
+
+class ExecutionWatcher:
+    """
+    Fans execution status changes out to subscribers.
+
+    While at least one execution is being watched, a single background task
+    looks up the status of every watched execution with one ``fetch_statuses``
+    call per ``poll_interval``. Updates can also be pushed in directly (for
+    example from Redis pub/sub) with :meth:`publish`.
+
+    An execution missing from ``max_missed_polls`` consecutive lookups gets a
+    final ``not_found`` status, and subscriptions end after
+    ``max_watch_seconds`` regardless, so unknown ids can't keep the poller alive.
+    """
+
+    def __init__(
+        self,
+        fetch_statuses: FetchStatusesFn,
+        poll_interval: float = 1.0,
+        max_missed_polls: int = 30,
+        max_watch_seconds: float = 3600.0,
+    ):
+        self.fetch_statuses = fetch_statuses
+        self.poll_interval = poll_interval
+        self.max_missed_polls = max_missed_polls
+        self.max_watch_seconds = max_watch_seconds
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._last: Dict[str, Dict[str, Any]] = {}
+        self._missed: Dict[str, int] = defaultdict(int)
+        self._poller: Optional[asyncio.Task] = None
+        self.polls = 0
+        self.poll_errors = 0
+        self.redis_reconnects = 0
+
+    def publish(self, update: Dict[str, Any]) -> None:
+        """Deliver a status update to subscribers if it differs from the last one"""
+        execution_id = str(update["id"])
+        if execution_id not in self._subscribers:
+            return
+        previous = self._last.get(execution_id, {})
+        # Partial updates (e.g. status-only pub/sub messages) are merged onto the last state
+        update = {**previous, **update, "id": execution_id}
+        if update == previous:
+            return
+        self._last[execution_id] = update
+        for queue in self._subscribers.get(execution_id, ()):
+            queue.put_nowait(update)
+
+    async def subscribe(
+        self, execution_id: str, keepalive: Optional[float] = None
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Yield status updates for an execution until it reaches a terminal state.
+
+        With ``keepalive`` set, ``None`` is yielded after that many idle seconds
+        so streaming transports can send a heartbeat.
+        """
+        execution_id = str(execution_id)
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers[execution_id].add(queue)
+        if execution_id in self._last:
+            queue.put_nowait(self._last[execution_id])
+        self._ensure_poller()
+        deadline = time.monotonic() + self.max_watch_seconds
+
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    update = await asyncio.wait_for(
+                        queue.get(), timeout=min(remaining, keepalive or remaining)
+                    )
+                except asyncio.TimeoutError:
+                    if keepalive and deadline - time.monotonic() > 0:
+                        yield None
+                    continue
+                yield update
+                if update.get("status") in TERMINAL_STATUSES:
+                    return
+        finally:
+            self._subscribers[execution_id].discard(queue)
+            if not self._subscribers[execution_id]:
+                del self._subscribers[execution_id]
+                self._last.pop(execution_id, None)
+                self._missed.pop(execution_id, None)
+
+    def _ensure_poller(self) -> None:
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll_loop())
+
+    async def _poll_loop(self) -> None:
+        while self._subscribers:
+            execution_ids = list(self._subscribers)
+            try:
+                updates = await self.fetch_statuses(execution_ids)
+                self.polls += 1
+                found = set()
+                for update in updates:
+                    found.add(str(update["id"]))
+                    self.publish(update)
+                for execution_id in execution_ids:
+                    if execution_id in found:
+                        self._missed.pop(execution_id, None)
+                        continue
+                    # The last subscriber may have left while the fetch was awaited
+                    if execution_id not in self._subscribers:
+                        continue
+                    self._missed[execution_id] += 1
+                    if self._missed[execution_id] >= self.max_missed_polls:
+                        self.publish({"id": execution_id, "status": "not_found"})
+            except Exception:
+                self.poll_errors += 1
+            await asyncio.sleep(self.poll_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "watched_executions": len(self._subscribers),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "polls": self.polls,
+            "poll_errors": self.poll_errors,
+            "redis_reconnects": self.redis_reconnects,
+        }
+
+
+async def listen_redis_events(
+    url: str, channel: str, watcher: ExecutionWatcher, retry_delay: float = 1.0
+) -> None:
+    """
+    Feed the watcher from a Redis pub/sub channel.
+
+    Messages are JSON objects with at least ``id`` (or ``executionId``) and
+    ``status``, as published by the n8n hook in ``n8n/hooks/execution-events.js``.
+    The subscription is re-established with backoff when Redis goes away.
+    """
+    import redis.asyncio as redis
+    from redis.exceptions import RedisError
+
+    backoff = retry_delay
+    while True:
+        client = redis.from_url(url)
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            backoff = retry_delay
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    update = json.loads(message["data"])
+                    update.setdefault("id", update.get("executionId"))
+                    if update["id"] is None:
+                        continue
+                    update["id"] = str(update["id"])
+                    watcher.publish(update)
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    continue
+        except (RedisError, OSError):
+            watcher.redis_reconnects += 1
+        finally:
+            try:
+                await pubsub.aclose()
+                await client.aclose()
+            except (RedisError, OSError):
+                pass
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 30.0)
@@ -0,0 +1,385 @@
+"""
+Vector index lifecycle management
+Tracks table growth since the last index build and rebuilds the pgvector index with parameters sized to the data
+"""
+
+import json
+import math
+import re
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+INDEX_NAME = "embeddings_vector_idx"
+VECTOR_INDEX_METHODS = ("ivfflat", "hnsw")
+
+BUILD_LOG_DDL = """
+    CREATE TABLE IF NOT EXISTS vector_index_builds (
+        id SERIAL PRIMARY KEY,
+        index_name TEXT NOT NULL,
+        method TEXT NOT NULL,
+        params JSONB,
+        rows_at_build BIGINT NOT NULL,
+        build_seconds DOUBLE PRECISION,
+        latency_before_ms DOUBLE PRECISION,
+        latency_after_ms DOUBLE PRECISION,
+        built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Session advisory lock held for the whole build, so only one build runs
+# across all api-bridge replicas sharing the database
+BUILD_LOCK_KEY = f"{INDEX_NAME}:build"
+
+
+class IndexBuildInProgress(RuntimeError):
+    """Raised when a rebuild is requested while another one is running"""
+
+
+def recommended_params(rows: int, method: str = "ivfflat") -> Dict[str, int]:
+    """Index parameters sized for the current row count"""
+    if method == "hnsw":
+        return {"m": 16, "ef_construction": 64}
+    return {"lists": max(1, int(round(math.sqrt(max(rows, 1)))))}
+
+
+def parse_reloptions(reloptions: Optional[List[str]]) -> Dict[str, int]:
+    params = {}
+    for option in reloptions or []:
+        key, _, value = option.partition("=")
+        if value.isdigit():
+            params[key] = int(value)
+    return params
+
+
+def needs_rebuild(
+    status: Dict[str, Any], drift_threshold: float = 0.5, min_rows: int = 1000
+) -> Optional[str]:
+    """Return why the index should be rebuilt, or None if it is fine"""
+    rows = status["rows"]
+    if rows < min_rows:
+        return None
+    index = status["index"]
+    if index is None:
+        return "missing"
+    if status["last_build"] is None:
+        return "never_built_with_data"
+    if status["drift"] > drift_threshold:
+        return "drift"
+    if index["method"] == "ivfflat":
+        lists = index["params"].get("lists", 0)
+        target = status["recommended"]["lists"]
+        if lists < target / 2 or lists > target * 2:
+            return "lists_out_of_range"
+    return None
+
+
+def _row_count(conn) -> int:
+    from sqlalchemy import text
+
+    # Planner estimates are instant. Autovacuum never analyzes a partitioned
+    # parent, so its estimate goes stale; sum the leaves (a plain table is its
+    # own only leaf) and count exactly the ones not analyzed yet.
+    leaves = conn.execute(
+        text("""
+            SELECT t.relid::regclass::text AS name, c.reltuples::bigint AS n
+            FROM pg_partition_tree('embeddings') t
+            JOIN pg_class c ON c.oid = t.relid
+            WHERE t.isleaf
+        """)
+    ).fetchall()
+    total = 0
+    for leaf in leaves:
+        if leaf.n is not None and leaf.n >= 0:
+            total += int(leaf.n)
+        else:
+            total += int(conn.execute(text(f"SELECT count(*) AS n FROM {leaf.name}")).fetchone().n)
+    return total
+
+
+def _leaf_partition_count(conn) -> int:
+    """Number of leaf partitions, or 0 when embeddings is a plain table"""
+    from sqlalchemy import text
+
+    return int(conn.execute(
+        text("""
+            SELECT count(*) AS n FROM pg_partition_tree('embeddings')
+            WHERE isleaf AND level > 0
+        """)
+    ).fetchone().n)
+
+
+def _current_index(conn) -> Optional[Dict[str, Any]]:
+    from sqlalchemy import text
+
+    row = conn.execute(
+        text("""
+            SELECT i.relname AS name, am.amname AS method, i.reloptions AS reloptions,
+                   pg_relation_size(i.oid) AS size_bytes
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            JOIN pg_am am ON am.oid = i.relam
+            WHERE x.indrelid = 'embeddings'::regclass
+              AND am.amname IN ('ivfflat', 'hnsw')
+            ORDER BY (i.relname = :name) DESC
+            LIMIT 1
+        """),
+        {"name": INDEX_NAME},
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        "name": row.name,
+        "method": row.method,
+        "params": parse_reloptions(row.reloptions),
+        "size_bytes": row.size_bytes,
+    }
+
+
+def _last_build(conn) -> Optional[Dict[str, Any]]:
+    from sqlalchemy import text
+
+    conn.execute(text(BUILD_LOG_DDL))
+    row = conn.execute(
+        text("SELECT * FROM vector_index_builds ORDER BY built_at DESC, id DESC LIMIT 1")
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        "method": row.method,
+        "params": row.params,
+        "rows_at_build": row.rows_at_build,
+        "build_seconds": row.build_seconds,
+        "latency_before_ms": row.latency_before_ms,
+        "latency_after_ms": row.latency_after_ms,
+        "built_at": row.built_at.isoformat() if row.built_at else None,
+    }
+
+
+def index_status(conn) -> Dict[str, Any]:
+    """Row count, current index and drift since the last recorded build"""
+    rows = _row_count(conn)
+    index = _current_index(conn)
+    last_build = _last_build(conn)
+    rows_at_build = last_build["rows_at_build"] if last_build else 0
+    method = index["method"] if index else "ivfflat"
+    partitions = _leaf_partition_count(conn)
+    return {
+        "rows": rows,
+        "partitions": partitions,
+        "index": index,
+        "last_build": last_build,
+        "drift": abs(rows - rows_at_build) / max(rows_at_build, 1),
+        # Partitioned tables get one index per partition, sized for the average partition
+        "recommended": recommended_params(rows // max(partitions, 1), method),
+    }
+
+
+def measure_search_latency(conn, samples: int = 5, limit: int = 10) -> Optional[float]:
+    """Median latency in ms of a top-k search using stored vectors as queries"""
+    from sqlalchemy import text
+
+    # Probe random ids rather than ORDER BY random(), which would scan the whole table
+    queries = conn.execute(
+        text("""
+            SELECT embedding::text AS v FROM embeddings
+            WHERE id IN (
+                SELECT (random() * (SELECT max(id) FROM embeddings))::int
+                FROM generate_series(1, :probes)
+            )
+            LIMIT :n
+        """),
+        {"n": samples, "probes": samples * 4},
+    ).fetchall()
+    if not queries:
+        queries = conn.execute(
+            text("SELECT embedding::text AS v FROM embeddings LIMIT :n"), {"n": samples}
+        ).fetchall()
+    if not queries:
+        return None
+
+    search = text("""
+        SELECT id FROM embeddings
+        ORDER BY embedding <=> CAST(:query_vector AS vector)
+        LIMIT :limit
+    """)
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        conn.execute(search, {"query_vector": query.v, "limit": limit}).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def _build_partitioned_index(conn, name: str, using: str) -> None:
+    """
+    Build ``name`` on the partitioned embeddings table without blocking writes.
+
+    CREATE INDEX CONCURRENTLY is not supported on a partitioned table, so the
+    index is created ``ON ONLY`` each partitioned table (invalid and empty),
+    every leaf gets its own index built concurrently, and each child index is
+    attached to its parent's. The parent index becomes valid once all of its
+    partitions have one attached.
+    """
+    from sqlalchemy import text
+
+    # Leftovers of an interrupted build: attached children are dropped with the
+    # parent, unattached (possibly invalid) ones are dropped one by one
+    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    leftovers = conn.execute(
+        text("""
+            SELECT c.relname AS name, c.relkind AS relkind
+            FROM pg_partition_tree('embeddings') t
+            JOIN pg_index x ON x.indrelid = t.relid
+            JOIN pg_class c ON c.oid = x.indexrelid
+            WHERE t.level > 0 AND c.relname LIKE :pattern
+              AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)
+        """),
+        {"pattern": name.replace("_", r"\_") + r"\_%"},
+    ).fetchall()
+    for row in leftovers:
+        concurrently = " CONCURRENTLY" if row.relkind == "i" else ""
+        conn.execute(text(f"DROP INDEX{concurrently} IF EXISTS {row.name}"))
+
+    tree = conn.execute(
+        text("""
+            SELECT relid::regclass::text AS relname, relid::oid::bigint AS oid,
+                   parentrelid::oid::bigint AS parent, isleaf, level
+            FROM pg_partition_tree('embeddings')
+            ORDER BY level
+        """)
+    ).fetchall()
+
+    # Child index names must be unique per build: the previous build's children
+    # stay attached to the live index until it is dropped
+    stamp = int(time.time())
+    index_for = {}
+    for part in tree:
+        if part.level == 0:
+            conn.execute(text(f"CREATE INDEX {name} ON ONLY embeddings {using}"))
+            index_for[part.oid] = name
+            continue
+        child = f"{name}_{part.oid}_{stamp}"
+        if part.isleaf:
+            conn.execute(text(f"CREATE INDEX CONCURRENTLY {child} ON {part.relname} {using}"))
+        else:
+            conn.execute(text(f"CREATE INDEX {child} ON ONLY {part.relname} {using}"))
+        conn.execute(text(f"ALTER INDEX {index_for[part.parent]} ATTACH PARTITION {child}"))
+        index_for[part.oid] = child
+
+
+def rebuild_index(
+    engine,
+    method: Optional[str] = None,
+    maintenance_work_mem: str = "1GB",
+    parallel_workers: int = 2,
+) -> Dict[str, Any]:
+    """
+    Rebuild the vector index without blocking writes.
+
+    With unchanged method and parameters the index is rebuilt with
+    ``REINDEX CONCURRENTLY``; otherwise a replacement is built concurrently
+    and swapped in under the same name.
+    """
+    from sqlalchemy import text
+
+    # CONCURRENTLY operations cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        locked = conn.execute(
+            text("SELECT pg_try_advisory_lock(hashtext(:key)) AS locked"), {"key": BUILD_LOCK_KEY}
+        ).fetchone().locked
+        if not locked:
+            raise IndexBuildInProgress("An index build is already running")
+
+        try:
+            status = index_status(conn)
+            current = status["index"]
+            method = method or (current["method"] if current else "ivfflat")
+            if method not in VECTOR_INDEX_METHODS:
+                raise ValueError(f"method must be one of {', '.join(VECTOR_INDEX_METHODS)}")
+            if not re.fullmatch(r"\d+\s*(kB|MB|GB)?", maintenance_work_mem):
+                raise ValueError(f"Invalid maintenance_work_mem: {maintenance_work_mem}")
+            partitions = status["partitions"]
+            params = recommended_params(status["rows"] // max(partitions, 1), method)
+            concurrently = "" if partitions else " CONCURRENTLY"
+            latency_before = measure_search_latency(conn)
+
+            conn.execute(text(f"SET maintenance_work_mem = '{maintenance_work_mem}'"))
+            conn.execute(
+                text(f"SET max_parallel_maintenance_workers = {int(parallel_workers)}")
+            )
+
+            with_clause = ", ".join(f"{key} = {int(value)}" for key, value in params.items())
+            started = time.monotonic()
+            if current and current["method"] == method and current["params"] == params:
+                action = "reindex"
+                conn.execute(text(f"REINDEX INDEX CONCURRENTLY {current['name']}"))
+            else:
+                action = "replace"
+                using = f"USING {method} (embedding vector_cosine_ops) WITH ({with_clause})"
+                if partitions:
+                    _build_partitioned_index(conn, f"{INDEX_NAME}_new", using)
+                else:
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}_new"))
+                    conn.execute(text(f"CREATE INDEX CONCURRENTLY {INDEX_NAME}_new ON embeddings {using}"))
+                if current:
+                    # DROP INDEX CONCURRENTLY is not supported on partitioned tables;
+                    # dropping the old index only holds its lock briefly
+                    conn.execute(text(f"DROP INDEX{concurrently} IF EXISTS {current['name']}"))
+                conn.execute(text(f"ALTER INDEX {INDEX_NAME}_new RENAME TO {INDEX_NAME}"))
+            build_seconds = round(time.monotonic() - started, 3)
+
+            conn.execute(text("ANALYZE embeddings"))
+            latency_after = measure_search_latency(conn)
+
+            conn.execute(
+                text("""
+                    INSERT INTO vector_index_builds
+                        (index_name, method, params, rows_at_build, build_seconds,
+                         latency_before_ms, latency_after_ms)
+                    VALUES (:index_name, :method, CAST(:params AS jsonb), :rows, :build_seconds,
+                            :latency_before, :latency_after)
+                """),
+                {
+                    "index_name": INDEX_NAME,
+                    "method": method,
+                    "params": json.dumps(params),
+                    "rows": status["rows"],
+                    "build_seconds": build_seconds,
+                    "latency_before": latency_before,
+                    "latency_after": latency_after,
+                },
+            )
+
+            return {
+                "action": action,
+                "index": INDEX_NAME,
+                "method": method,
+                "params": params,
+                "rows": status["rows"],
+                "build_seconds": build_seconds,
+                "latency_before_ms": latency_before,
+                "latency_after_ms": latency_after,
+            }
+        finally:
+            # The connection goes back to the pool: drop the build settings and the lock
+            try:
+                conn.execute(text("RESET maintenance_work_mem"))
+                conn.execute(text("RESET max_parallel_maintenance_workers"))
+                conn.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), {"key": BUILD_LOCK_KEY})
+            except Exception:
+                # A broken session releases its lock; never return it to the pool
+                conn.invalidate()
+
+
+def maybe_rebuild(engine, drift_threshold: float = 0.5, min_rows: int = 1000, **build_options) -> Dict[str, Any]:
+    """Rebuild only if the index is missing, stale or mis-sized"""
+    with engine.connect() as conn:
+        status = index_status(conn)
+        conn.commit()
+    reason = needs_rebuild(status, drift_threshold=drift_threshold, min_rows=min_rows)
+    if reason is None:
+        return {"action": "none", "status": status}
+    result = rebuild_index(engine, **build_options)
+    result["reason"] = reason
+    return result
@@ -0,0 +1,420 @@
+"""
+Partitioned embeddings storage
+Optional declarative partitioning of the embeddings table by tenant and/or created_at
+"""
+
+import hashlib
+import heapq
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from index_manager import recommended_params
+from vector_store import embedding_dimension
+
+PARTITION_INTERVALS = ("day", "week", "month")
+
+REGISTRY_DDL = """
+    CREATE TABLE IF NOT EXISTS embeddings_partitions (
+        name TEXT PRIMARY KEY,
+        parent TEXT NOT NULL,
+        tenant TEXT,
+        range_start TIMESTAMP,
+        range_end TIMESTAMP,
+        is_leaf BOOLEAN NOT NULL,
+        detached_at TIMESTAMP
+    )
+"""
+
+
+def period_bounds(ts: datetime, interval: str = "month") -> Tuple[datetime, datetime]:
+    """Start (inclusive) and end (exclusive) of the partition period containing ts"""
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    if interval == "day":
+        return day, day + timedelta(days=1)
+    if interval == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    start = day.replace(day=1)
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start, end
+
+
+def tenant_slug(tenant: str) -> str:
+    """Identifier-safe, collision-resistant form of a tenant name"""
+    readable = re.sub(r"[^a-z0-9]+", "_", tenant.lower()).strip("_")[:16]
+    return f"{readable}_{hashlib.sha1(tenant.encode('utf-8')).hexdigest()[:8]}"
+
+
+class PartitionLayout:
+    """
+    How the embeddings table is partitioned.
+
+    ``by_tenant`` list-partitions on a ``tenant`` column filled from
+    ``metadata[tenant_key]``; ``by_time`` range-partitions on ``created_at``
+    per ``interval``. With both, each tenant partition is sub-partitioned by
+    time. Partitions are created on demand and recorded in
+    ``embeddings_partitions`` so searches can prune without parsing catalog
+    bounds.
+    """
+
+    def __init__(
+        self,
+        by_tenant: bool = False,
+        by_time: bool = False,
+        tenant_key: str = "tenant",
+        interval: str = "month",
+        default_tenant: str = "default",
+    ):
+        if interval not in PARTITION_INTERVALS:
+            raise ValueError(f"interval must be one of {', '.join(PARTITION_INTERVALS)}")
+        self.by_tenant = by_tenant
+        self.by_time = by_time
+        self.tenant_key = tenant_key
+        self.interval = interval
+        self.default_tenant = default_tenant
+
+    @classmethod
+    def from_setting(cls, partition_by: str, **kwargs) -> "PartitionLayout":
+        """Build from a comma-separated setting such as ``"tenant,time"``"""
+        parts = {part.strip() for part in partition_by.split(",") if part.strip()}
+        unknown = parts - {"tenant", "time"}
+        if unknown:
+            raise ValueError(f"Unknown partition keys: {', '.join(sorted(unknown))}")
+        return cls(by_tenant="tenant" in parts, by_time="time" in parts, **kwargs)
+
+    @property
+    def enabled(self) -> bool:
+        return self.by_tenant or self.by_time
+
+    @property
+    def unique_columns(self) -> str:
+        """Columns of the content-hash unique index (must include the partition keys)"""
+        columns = ["content_hash"]
+        if self.by_tenant:
+            columns.insert(0, "tenant")
+        if self.by_time:
+            columns.append("created_at")
+        return ", ".join(columns)
+
+    @property
+    def conflict_target(self) -> Optional[str]:
+        """ON CONFLICT target for upserts, or None when uniqueness spans time partitions"""
+        if self.by_time:
+            return None
+        return "(tenant, content_hash)" if self.by_tenant else "(content_hash)"
+
+    def tenant_for(self, metadata: Optional[Dict[str, Any]]) -> str:
+        return str((metadata or {}).get(self.tenant_key) or self.default_tenant)
+
+    # ------------------------------------------------------------------------
+    # Partition creation
+    # ------------------------------------------------------------------------
+
+    def _create_partition(self, conn, name, parent, bound_sql, tenant, start, end, is_leaf):
+        from sqlalchemy import text
+
+        sub = " PARTITION BY RANGE (created_at)" if not is_leaf else ""
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {parent} FOR VALUES {bound_sql}{sub}"
+        ))
+        conn.execute(
+            text("""
+                INSERT INTO embeddings_partitions (name, parent, tenant, range_start, range_end, is_leaf)
+                VALUES (:name, :parent, :tenant, :start, :end, :is_leaf)
+                ON CONFLICT (name) DO NOTHING
+            """),
+            {"name": name, "parent": parent, "tenant": tenant, "start": start, "end": end, "is_leaf": is_leaf},
+        )
+
+    def ensure_partitions(self, conn, keys: Iterable[Tuple[Optional[str], Optional[datetime]]], table: str = "embeddings") -> None:
+        """
+        Create (idempotently) the partitions for (tenant, created_at) pairs about to be written.
+
+        ``CREATE TABLE ... PARTITION OF`` locks the parent until commit, so
+        writers call this on a separate autocommit connection before opening
+        their write transaction. Partitions already in the registry are
+        skipped without touching the parent.
+        """
+        from sqlalchemy import text
+
+        wanted: Dict[str, Tuple] = {}
+        for tenant, ts in keys:
+            parent = table
+            name = f"{table}_p"
+            if self.by_tenant:
+                name = f"{name}_{tenant_slug(tenant)}"
+                wanted.setdefault(name, (
+                    name, parent, f"IN ('{tenant.replace(chr(39), chr(39) * 2)}')",
+                    tenant, None, None, not self.by_time,
+                ))
+                parent = name
+            if self.by_time:
+                start, end = period_bounds(ts or datetime.now(), self.interval)
+                name = f"{name}_{start:%Y%m%d}"
+                wanted.setdefault(name, (
+                    name, parent, f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')",
+                    tenant if self.by_tenant else None, start, end, True,
+                ))
+
+        conn.execute(text(REGISTRY_DDL))
+        existing = {
+            row.name for row in conn.execute(
+                text("""
+                    SELECT name FROM embeddings_partitions
+                    WHERE name = ANY(:names)
+                """),
+                {"names": list(wanted)},
+            )
+        }
+        # Insertion order creates each tenant partition before its time partitions
+        for name, partition in wanted.items():
+            if name not in existing:
+                self._create_partition(conn, *partition)
+
+    # ------------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------------
+
+    def leaf_partitions(
+        self,
+        conn,
+        tenants: Optional[List[str]] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ) -> List[str]:
+        """Attached leaf partitions that can contain rows matching the filters"""
+        from sqlalchemy import text
+
+        result = conn.execute(
+            text("""
+                SELECT name FROM embeddings_partitions
+                WHERE is_leaf AND detached_at IS NULL
+                  AND (CAST(:tenants AS text[]) IS NULL OR tenant = ANY(CAST(:tenants AS text[])))
+                  AND (CAST(:after AS timestamp) IS NULL OR range_end IS NULL OR range_end > :after)
+                  AND (CAST(:before AS timestamp) IS NULL OR range_start IS NULL OR range_start < :before)
+                ORDER BY name
+            """),
+            {"tenants": tenants, "after": created_after, "before": created_before},
+        )
+        return [row.name for row in result]
+
+    # ------------------------------------------------------------------------
+    # Retention
+    # ------------------------------------------------------------------------
+
+    def detach_expired(self, engine, older_than: datetime, drop: bool = False) -> List[str]:
+        """Detach (and optionally drop) time partitions that end before ``older_than``"""
+        from sqlalchemy import text
+
+        if not self.by_time:
+            return []
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            expired = conn.execute(
+                text("""
+                    SELECT name, parent FROM embeddings_partitions
+                    WHERE is_leaf AND detached_at IS NULL AND range_end <= :older_than
+                    ORDER BY range_end
+                """),
+                {"older_than": older_than},
+            ).fetchall()
+            for row in expired:
+                # Whole-partition detach avoids the bloat of DELETE + VACUUM
+                conn.execute(text(f"ALTER TABLE {row.parent} DETACH PARTITION {row.name} CONCURRENTLY"))
+                if drop:
+                    conn.execute(text(f"DROP TABLE IF EXISTS {row.name}"))
+                conn.execute(
+                    text("UPDATE embeddings_partitions SET detached_at = now() WHERE name = :name"),
+                    {"name": row.name},
+                )
+        return [row.name for row in expired]
+
+    # ------------------------------------------------------------------------
+    # Migration from the single table
+    # ------------------------------------------------------------------------
+
+    def migrate(self, engine, batch_size: int = 10000, dry_run: bool = True) -> Dict[str, Any]:
+        """
+        Copy the single ``embeddings`` table into a partitioned one and swap names.
+
+        The old table is kept as ``embeddings_unpartitioned`` so the
+        migration can be verified (or reverted) before dropping it. Rows are
+        copied in committed batches; if a run fails partway, the next one
+        resumes after the highest id already copied.
+        """
+        from sqlalchemy import text
+
+        if not self.enabled:
+            raise ValueError("No partition keys configured")
+
+        with engine.connect() as conn:
+            relkind = conn.execute(
+                text("SELECT relkind FROM pg_class WHERE oid = 'embeddings'::regclass")
+            ).fetchone().relkind
+            if relkind == "p":
+                return {"status": "already_partitioned"}
+            rows = conn.execute(text("SELECT count(*) AS n FROM embeddings")).fetchone().n
+            groups = conn.execute(text(f"""
+                SELECT DISTINCT COALESCE(metadata->>'{self.tenant_key}', :default_tenant) AS tenant,
+                       date_trunc('{self.interval}', COALESCE(created_at, now())) AS period
+                FROM embeddings
+            """), {"default_tenant": self.default_tenant}).fetchall()
+
+            # A previous run that failed partway leaves its copy behind
+            resume_from_id = None
+            if conn.execute(text("SELECT to_regclass('embeddings_partitioned') AS t")).fetchone().t:
+                resume_from_id = conn.execute(
+                    text("SELECT COALESCE(max(id), 0) AS id FROM embeddings_partitioned")
+                ).fetchone().id
+
+            plan = {
+                "status": "planned" if dry_run else "migrated",
+                "resume_from_id": resume_from_id,
+                "rows": rows,
+                "partition_by": [key for key, on in (("tenant", self.by_tenant), ("time", self.by_time)) if on],
+                "tenants": sorted({g.tenant for g in groups}) if self.by_tenant else [],
+                "periods": len({g.period for g in groups}) if self.by_time else 0,
+            }
+            if dry_run:
+                return plan
+
+            key_columns = []
+            if self.by_tenant:
+                key_columns.append("tenant")
+            if self.by_time:
+                key_columns.append("created_at")
+            partition_by = (
+                "LIST (tenant)" if self.by_tenant else "RANGE (created_at)"
+            )
+            # Keep the dimension of the existing column
+            dimension = embedding_dimension(conn)
+            vector_type = f"vector({dimension})" if dimension else "vector"
+            conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS embeddings_partitioned (
+                    id INTEGER NOT NULL DEFAULT nextval('embeddings_id_seq'),
+                    content TEXT,
+                    embedding {vector_type},
+                    metadata JSONB,
+                    content_hash TEXT,
+                    tenant TEXT NOT NULL DEFAULT '{self.default_tenant}',
+                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (id, {", ".join(key_columns)})
+                ) PARTITION BY {partition_by}
+            """))
+            self.ensure_partitions(
+                conn,
+                [(g.tenant, g.period) for g in groups] + [(self.default_tenant, datetime.now())],
+                table="embeddings_partitioned",
+            )
+
+            last_id = resume_from_id or 0
+            while True:
+                copied = conn.execute(
+                    text(f"""
+                        INSERT INTO embeddings_partitioned
+                            (id, content, embedding, metadata, content_hash, tenant, created_at)
+                        SELECT id, content, embedding, metadata, content_hash,
+                               COALESCE(metadata->>'{self.tenant_key}', :default_tenant),
+                               COALESCE(created_at, now())
+                        FROM embeddings
+                        WHERE id > :last_id
+                        ORDER BY id
+                        LIMIT :batch_size
+                        RETURNING id
+                    """),
+                    {"last_id": last_id, "batch_size": batch_size, "default_tenant": self.default_tenant},
+                ).fetchall()
+                if not copied:
+                    break
+                last_id = max(row.id for row in copied)
+                conn.commit()
+
+            # Size lists per partition, as index_status and rebuild_index do
+            leaves = conn.execute(text("""
+                SELECT count(*) AS n FROM pg_partition_tree('embeddings_partitioned')
+                WHERE isleaf AND level > 0
+            """)).fetchone().n
+            lists = recommended_params(rows // max(leaves, 1))["lists"]
+            conn.execute(text("ALTER INDEX IF EXISTS embeddings_vector_idx RENAME TO embeddings_unpartitioned_vector_idx"))
+            conn.execute(text("ALTER INDEX IF EXISTS embeddings_content_hash_idx RENAME TO embeddings_unpartitioned_content_hash_idx"))
+            # Indexes on the parent are created on every partition, current and future
+            conn.execute(text(f"""
+                CREATE INDEX embeddings_vector_idx ON embeddings_partitioned
+                USING ivfflat (embedding vector_cosine_ops) WITH (lists = {lists})
+            """))
+            conn.execute(text(
+                f"CREATE UNIQUE INDEX embeddings_content_hash_idx ON embeddings_partitioned ({self.unique_columns})"
+            ))
+            conn.execute(text("ALTER TABLE embeddings RENAME TO embeddings_unpartitioned"))
+            conn.execute(text("ALTER TABLE embeddings_partitioned RENAME TO embeddings"))
+            conn.execute(text("ALTER SEQUENCE embeddings_id_seq OWNED BY embeddings.id"))
+            conn.execute(text("""
+                UPDATE embeddings_partitions
+                SET name = replace(name, 'embeddings_partitioned', 'embeddings'),
+                    parent = replace(parent, 'embeddings_partitioned', 'embeddings')
+            """))
+            for row in conn.execute(text("SELECT name FROM embeddings_partitions")).fetchall():
+                old_name = row.name.replace("embeddings", "embeddings_partitioned", 1)
+                conn.execute(text(f"ALTER TABLE IF EXISTS {old_name} RENAME TO {row.name}"))
+            conn.execute(text("ANALYZE embeddings"))
+            conn.commit()
+            return plan
+
+
+def search_partitions(
+    engine,
+    partitions: List[str],
+    query_vector: str,
+    limit: int,
+    threshold: float,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    tenant: Optional[str] = None,
+    tenant_column: str = "tenant",
+    max_workers: int = 4,
+    with_embeddings: bool = False,
+) -> List[Dict[str, Any]]:
+    """Top-k per partition in parallel, merged into a global top-k by similarity"""
+    from sqlalchemy import text
+
+    embedding_column = ", embedding::text AS embedding" if with_embeddings else ""
+
+    def search_one(partition: str) -> List[Dict[str, Any]]:
+        with engine.connect() as conn:
+            result = conn.execute(
+                text(f"""
+                    SELECT * FROM (
+                        SELECT id, content, metadata,
+                               1 - (embedding <=> CAST(:query_vector AS vector)) AS similarity{embedding_column}
+                        FROM {partition}
+                        WHERE (CAST(:after AS timestamp) IS NULL OR created_at >= :after)
+                          AND (CAST(:before AS timestamp) IS NULL OR created_at < :before)
+                          AND (CAST(:tenant AS text) IS NULL OR {tenant_column} = :tenant)
+                        ORDER BY embedding <=> CAST(:query_vector AS vector)
+                        LIMIT :limit
+                    ) top
+                    WHERE similarity >= :threshold
+                """),
+                {
+                    "query_vector": query_vector,
+                    "limit": limit,
+                    "threshold": threshold,
+                    "after": created_after,
+                    "before": created_before,
+                    "tenant": tenant,
+                },
+            )
+            rows = []
+            for row in result:
+                found = {"id": row.id, "content": row.content, "similarity": float(row.similarity), "metadata": row.metadata}
+                if with_embeddings:
+                    found["embedding"] = row.embedding
+                rows.append(found)
+            return rows
+
+    if not partitions:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(partitions))) as pool:
+        per_partition = list(pool.map(search_one, partitions))
+    return heapq.nlargest(limit, (r for results in per_partition for r in results), key=lambda r: r["similarity"])
@@ -0,0 +1,92 @@
+"""
+Vector result re-ranking
+Maximal marginal relevance, near-duplicate suppression and per-source caps over a candidate set
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+# Upper bound on candidates fetched for re-ranking, whatever the request asks for
+MAX_FETCH_K = 1000
+
+
+def parse_vector(value: Union[str, Sequence[float]]) -> List[float]:
+    """pgvector's text form (``[0.1,0.2]``) or an already decoded sequence"""
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def mmr_rerank(
+    query_vector: Sequence[float],
+    candidates: List[Dict[str, Any]],
+    limit: int,
+    lambda_mult: float = 0.5,
+    duplicate_threshold: Optional[float] = None,
+    max_per_source: Optional[int] = None,
+    source_key: str = "source",
+) -> List[Dict[str, Any]]:
+    """
+    Pick ``limit`` candidates by maximal marginal relevance.
+
+    Each step selects the candidate maximising
+    ``lambda_mult * sim(query, c) - (1 - lambda_mult) * max(sim(c, selected))``.
+    Candidates whose cosine similarity to an already selected one is at least
+    ``duplicate_threshold`` are dropped, and at most ``max_per_source``
+    results are kept per ``metadata[source_key]``; candidates without a
+    source are not capped. Candidates need an
+    ``embedding``; it is not included in the returned rows.
+    """
+    if not candidates or limit <= 0:
+        return []
+
+    vectors = _normalize(np.asarray([parse_vector(c["embedding"]) for c in candidates], dtype=np.float32))
+    query = _normalize(np.asarray(query_vector, dtype=np.float32))
+    relevance = vectors @ query
+
+    available = np.ones(len(candidates), dtype=bool)
+    # Highest similarity of each candidate to anything selected so far
+    redundancy = np.full(len(candidates), -np.inf, dtype=np.float32)
+
+    sources = None
+    if max_per_source is not None:
+        labels = [(c.get("metadata") or {}).get(source_key) for c in candidates]
+        labels = [None if label is None or label == "" else str(label) for label in labels]
+        named = dict.fromkeys(label for label in labels if label is not None)
+        source_ids = {label: i for i, label in enumerate(named)}
+        # Candidates without a source are not capped (-1)
+        sources = np.asarray([source_ids.get(label, -1) for label in labels])
+        picked_per_source = np.zeros(len(source_ids), dtype=np.int64)
+
+    selected: List[int] = []
+    while len(selected) < limit and available.any():
+        if selected:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        chosen = int(np.argmax(scores))
+        selected.append(chosen)
+        available[chosen] = False
+
+        similarity = vectors @ vectors[chosen]
+        np.maximum(redundancy, similarity, out=redundancy)
+        if duplicate_threshold is not None:
+            available &= similarity < duplicate_threshold
+        if sources is not None and sources[chosen] >= 0:
+            source = sources[chosen]
+            picked_per_source[source] += 1
+            if picked_per_source[source] >= max_per_source:
+                available &= sources != source
+
+    return [
+        {key: value for key, value in candidates[i].items() if key != "embedding"}
+        for i in selected
+    ]
@@ -0,0 +1,127 @@
+"""
+Tests for per-API-key admission control.
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+from admission import AdmissionController, InMemoryAdmissionStore
+
+client = TestClient(main.app)
+
+
+async def test_rate_limit_rejects_after_burst():
+    """Requests beyond the bucket's burst are rejected with 429 and Retry-After."""
+    controller = AdmissionController(InMemoryAdmissionStore(), rate=0.5, burst=2)
+
+    for _ in range(2):
+        key = await controller.acquire("route", "key-a")
+        await controller.release(key, "route", 1.0)
+
+    with pytest.raises(HTTPException) as exc:
+        await controller.acquire("route", "key-a")
+
+    assert exc.value.status_code == 429
+    assert int(exc.value.headers["Retry-After"]) >= 1
+    assert controller.stats()["rejected"]["route"]["rate_limited"] == 1
+
+    # Other API keys have their own bucket
+    await controller.acquire("route", "key-b")
+
+
+async def test_in_flight_limit():
+    """Concurrent requests per key are capped until a slot is released."""
+    controller = AdmissionController(InMemoryAdmissionStore(), rate=100, burst=100, max_in_flight=1)
+
+    key = await controller.acquire("route", "key-a")
+    with pytest.raises(HTTPException) as exc:
+        await controller.acquire("route", "key-a")
+    assert exc.value.status_code == 429
+
+    await controller.release(key, "route", 1.0)
+    await controller.acquire("route", "key-a")
+
+
+async def test_in_flight_rejection_keeps_rate_budget():
+    controller = AdmissionController(InMemoryAdmissionStore(), rate=0.01, burst=2, max_in_flight=1)
+
+    key = await controller.acquire("route", "key-a")
+    for _ in range(3):
+        with pytest.raises(HTTPException) as exc:
+            await controller.acquire("route", "key-a")
+        assert exc.value.detail.endswith("too_many_in_flight")
+
+    await controller.release(key, "route", 1.0)
+    await controller.acquire("route", "key-a")
+
+
+async def test_in_memory_state_is_dropped_when_idle():
+    """Random API keys can't grow the store: idle buckets and slots are forgotten."""
+    store = InMemoryAdmissionStore(sweep_interval=0.0)
+    controller = AdmissionController(store, rate=1000, burst=1)
+
+    for i in range(50):
+        key = await controller.acquire("route", f"random-{i}")
+        await controller.release(key, "route", 1.0)
+    assert store._in_flight == {}
+
+    await asyncio.sleep(0.01)
+    await store.take_token("other", 1000, 1)
+    assert list(store._buckets) == ["other"]
+
+
+async def test_route_limits_override_defaults():
+    """Per-route limits take precedence over the global defaults."""
+    controller = AdmissionController(
+        InMemoryAdmissionStore(), rate=100, burst=100, route_limits={"slow": {"burst": 1, "rate": 0.1}}
+    )
+
+    await controller.acquire("slow", "key-a")
+    with pytest.raises(HTTPException):
+        await controller.acquire("slow", "key-a")
+    await controller.acquire("fast", "key-a")
+
+
+def test_invalid_limits_are_rejected_at_startup():
+    """A zero rate would otherwise fail every request on the route with a 500."""
+    with pytest.raises(ValueError, match="'slow'"):
+        AdmissionController(InMemoryAdmissionStore(), route_limits={"slow": {"rate": 0}})
+    with pytest.raises(ValueError):
+        AdmissionController(InMemoryAdmissionStore(), burst=0)
+
+
+async def test_load_shedding_on_high_latency():
+    """Slow upstream latency sheds load with 503 but still admits a probe."""
+    controller = AdmissionController(
+        InMemoryAdmissionStore(), rate=100, burst=100, max_in_flight=100, shed_latency_ms=100
+    )
+    key = await controller.acquire("route", None)
+    await controller.release(key, "route", 5000.0)
+
+    # First request after the spike is the recovery probe
+    await controller.acquire("route", None)
+    with pytest.raises(HTTPException) as exc:
+        await controller.acquire("route", None)
+
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == "5"
+    assert controller.stats()["rejected"]["route"]["overloaded"] == 1
+
+
+def test_endpoint_returns_429(monkeypatch):
+    """Rejected requests never reach n8n."""
+    controller = AdmissionController(InMemoryAdmissionStore(), rate=0.01, burst=1)
+    monkeypatch.setattr(main, "admission_controller", controller)
+    key = "endpoint-test-key"
+
+    # Exhaust the single token directly, then hit the endpoint
+    asyncio.run(controller.acquire("list_workflows", key))
+    response = client.get("/api/v1/workflows", headers={"X-N8N-API-KEY": key})
+
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    assert client.get("/api/v1/admission/stats").json()["rejected"]["list_workflows"]["rate_limited"] == 1
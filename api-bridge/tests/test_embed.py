@@ -0,0 +1,111 @@
+"""
+Tests for the embedding micro-batcher and embed endpoints.
+"""
+
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+
+import main
+from embedding_batcher import EmbeddingBatcher, EmbeddingCache, ollama_embed_fn
+
+client = TestClient(main.app)
+
+
+def make_fake_embed(calls):
+    async def fake_embed(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    return fake_embed
+
+
+async def test_concurrent_requests_share_one_batch():
+    """Concurrent callers are merged into a single model call."""
+    calls = []
+    batcher = EmbeddingBatcher("test", make_fake_embed(calls), max_batch_size=100, max_wait_ms=20)
+
+    results = await asyncio.gather(
+        batcher.embed(["a"]), batcher.embed(["bb", "ccc"]), batcher.embed(["a"])
+    )
+
+    assert len(calls) == 1
+    assert sorted(calls[0]) == ["a", "bb", "ccc"]
+    assert results == [[[1.0, 1.0]], [[2.0, 1.0], [3.0, 1.0]], [[1.0, 1.0]]]
+
+
+async def test_batch_flushes_at_max_size():
+    """A full batch is sent without waiting for the timer."""
+    calls = []
+    batcher = EmbeddingBatcher("test", make_fake_embed(calls), max_batch_size=2, max_wait_ms=10000)
+
+    await asyncio.wait_for(batcher.embed(["x", "y", "z", "w"]), timeout=1.0)
+
+    assert calls == [["x", "y"], ["z", "w"]]
+
+
+async def test_cache_skips_model_call():
+    """Identical text is never re-embedded when the cache is enabled."""
+    calls = []
+    batcher = EmbeddingBatcher("test", make_fake_embed(calls), max_wait_ms=1, cache=EmbeddingCache())
+
+    first = await batcher.embed(["hello"])
+    second = await batcher.embed(["hello"])
+
+    assert first == second
+    assert len(calls) == 1
+    assert batcher.cache_hits == 1
+
+
+async def test_model_error_propagates_to_callers():
+    """A failed batch call raises in every waiting caller."""
+
+    async def failing_embed(texts):
+        raise RuntimeError("model unavailable")
+
+    batcher = EmbeddingBatcher("test", failing_embed, max_wait_ms=1)
+    results = await asyncio.gather(
+        batcher.embed(["a"]), batcher.embed(["b"]), return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_embed_endpoint(monkeypatch):
+    """Embed endpoint returns one vector per input text."""
+    calls = []
+    batcher = EmbeddingBatcher("fake-model", make_fake_embed(calls), max_wait_ms=1)
+    monkeypatch.setattr(main, "get_embedding_batcher", lambda model=None: batcher)
+
+    response = client.post("/api/v1/embed", json={"texts": ["one", "three"]})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["model"] == "fake-model"
+    assert data["count"] == 2
+    assert data["embeddings"] == [[3.0, 1.0], [5.0, 1.0]]
+
+
+def test_unconfigured_models_are_rejected():
+    """Batchers are only created for configured models."""
+    response = client.post("/api/v1/embed", json={"texts": ["a"], "model": "not-configured"})
+
+    assert response.status_code == 400
+    assert "not-configured" not in main.embedding_batchers
+
+
+async def test_ollama_batches_share_one_client():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"embeddings": [[1.0]]})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+        embed = ollama_embed_fn("http://ollama:11434", "m", client=http)
+        assert await embed(["a"]) == [[1.0]]
+        assert await embed(["b"]) == [[1.0]]
+        assert not http.is_closed
+
+    assert [r.url.path for r in requests] == ["/api/embed", "/api/embed"]
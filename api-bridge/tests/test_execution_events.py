@@ -0,0 +1,209 @@
+"""
+Tests for execution status push (shared watcher and SSE endpoint).
+"""
+
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import main
+from execution_events import ExecutionWatcher
+
+client = TestClient(main.app)
+
+
+def make_fake_fetch(calls, statuses):
+    """Fake status lookup that advances each execution through the given states."""
+
+    async def fetch(execution_ids):
+        calls.append(sorted(execution_ids))
+        return [
+            {"id": i, "status": statuses[i].pop(0) if len(statuses[i]) > 1 else statuses[i][0]}
+            for i in execution_ids
+        ]
+
+    return fetch
+
+
+async def collect(watcher, execution_id):
+    return [update["status"] async for update in watcher.subscribe(execution_id)]
+
+
+async def test_many_subscribers_share_one_query():
+    """All watched executions are looked up with a single query per poll."""
+    calls = []
+    statuses = {"1": ["running", "success"], "2": ["running", "running", "error"]}
+    watcher = ExecutionWatcher(make_fake_fetch(calls, statuses), poll_interval=0.01)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(collect(watcher, "1"), collect(watcher, "1"), collect(watcher, "2")),
+        timeout=2.0,
+    )
+
+    assert results == [["running", "success"], ["running", "success"], ["running", "error"]]
+    assert calls[0] == ["1", "2"]
+    assert all(len(call) <= 2 for call in calls)
+    assert watcher.stats()["watched_executions"] == 0
+
+
+async def test_published_updates_are_merged_and_deduplicated():
+    """Pushed status-only updates merge onto the polled state."""
+
+    async def fetch(execution_ids):
+        return [{"id": "7", "status": "running", "workflow_id": "wf"}]
+
+    watcher = ExecutionWatcher(fetch, poll_interval=0.01)
+    updates = []
+
+    async def consume():
+        async for update in watcher.subscribe("7"):
+            updates.append(update)
+
+    task = asyncio.ensure_future(consume())
+    await asyncio.sleep(0.05)
+    watcher.publish({"id": 7, "status": "success"})
+    await asyncio.wait_for(task, timeout=1.0)
+
+    assert updates == [
+        {"id": "7", "status": "running", "workflow_id": "wf"},
+        {"id": "7", "status": "success", "workflow_id": "wf"},
+    ]
+
+
+def test_sse_endpoint_streams_until_finished(monkeypatch):
+    """SSE endpoint emits one event per status change and closes on completion."""
+    statuses = {"42": ["running", "success"]}
+    watcher = ExecutionWatcher(make_fake_fetch([], statuses), poll_interval=0.01)
+    monkeypatch.setattr(main, "execution_watcher", watcher)
+
+    with client.stream("GET", "/api/v1/executions/42/events") as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = "".join(response.iter_text())
+
+    assert body.count("event: status") == 2
+    assert '"status": "success"' in body
+
+
+async def test_unknown_execution_ends_with_not_found():
+    """Ids the lookup never returns don't keep the stream or poller alive."""
+
+    async def fetch(execution_ids):
+        return []
+
+    watcher = ExecutionWatcher(fetch, poll_interval=0.01, max_missed_polls=3)
+    updates = await asyncio.wait_for(collect(watcher, "404"), timeout=1.0)
+
+    assert updates == ["not_found"]
+    await asyncio.sleep(0.05)
+    assert watcher._poller.done()
+
+
+async def test_unsubscribed_ids_are_not_counted_as_missed():
+    """An id whose last subscriber left during the fetch leaves no state behind."""
+    fetching = asyncio.Event()
+    release = asyncio.Event()
+
+    async def fetch(execution_ids):
+        fetching.set()
+        await release.wait()
+        return []
+
+    watcher = ExecutionWatcher(fetch, poll_interval=0.01)
+    task = asyncio.create_task(collect(watcher, "9"))
+    await fetching.wait()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    release.set()
+    await asyncio.sleep(0.05)
+    assert watcher._missed == {}
+    assert watcher._poller.done()
+
+
+async def test_keepalive_and_deadline():
+    """Idle subscriptions yield keep-alive markers and close at the deadline."""
+
+    async def fetch(execution_ids):
+        return [{"id": "5", "status": "running"}]
+
+    watcher = ExecutionWatcher(fetch, poll_interval=0.01, max_watch_seconds=0.2)
+    updates = [u async for u in watcher.subscribe("5", keepalive=0.05)]
+
+    assert updates[0]["status"] == "running"
+    assert None in updates
+    assert watcher.stats()["watched_executions"] == 0
+
+
+def test_sse_endpoint_rejects_non_numeric_ids():
+    response = client.get("/api/v1/executions/unknown/events")
+    assert response.status_code == 400
+
+
+async def test_redis_listener_reconnects(monkeypatch):
+    """A dropped Redis connection is re-subscribed instead of ending the listener."""
+    import redis.asyncio
+    from redis.exceptions import ConnectionError as RedisConnectionError
+
+    from execution_events import listen_redis_events
+
+    attempts = []
+
+    class FakePubSub:
+        async def subscribe(self, channel):
+            attempts.append(channel)
+            if len(attempts) == 1:
+                raise RedisConnectionError("connection refused")
+
+        async def listen(self):
+            yield {"type": "message", "data": '{"executionId": 9, "status": "success"}'}
+            await asyncio.Event().wait()
+
+        async def aclose(self):
+            pass
+
+    class FakeClient:
+        def pubsub(self):
+            return FakePubSub()
+
+        async def aclose(self):
+            pass
+
+    monkeypatch.setattr(redis.asyncio, "from_url", lambda url: FakeClient())
+
+    async def fetch(execution_ids):
+        return [{"id": "9", "status": "running"}]
+
+    watcher = ExecutionWatcher(fetch, poll_interval=10)
+    consumer = asyncio.ensure_future(collect(watcher, "9"))
+    listener = asyncio.ensure_future(listen_redis_events("redis://x", "ch", watcher, retry_delay=0.01))
+
+    assert await asyncio.wait_for(consumer, timeout=1.0) == ["running", "success"]
+    assert len(attempts) == 2
+    assert watcher.stats()["redis_reconnects"] == 1
+    listener.cancel()
+
+
+def test_status_lookup_uses_n8n_database(monkeypatch):
+    """execution_entity lives in n8n's database, not on the vector primary."""
+    urls = []
+
+    class Conn:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            return False
+
+        def execute(self, *args):
+            return []
+
+    def engine(url):
+        urls.append(url)
+        return type("Engine", (), {"connect": lambda self: Conn()})()
+
+    monkeypatch.setattr(main, "POSTGRES_URL", "postgresql://n8n@n8n-db/n8n")
+    monkeypatch.setattr(main.db_router, "engine", engine)
+
+    assert main._fetch_execution_statuses_sync(["7", "unknown"]) == []
+    assert urls == ["postgresql://n8n@n8n-db/n8n"]
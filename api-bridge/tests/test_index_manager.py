@@ -0,0 +1,179 @@
+"""
+Tests for vector index lifecycle decisions.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+import sqlalchemy
+
+import index_manager
+from index_manager import (
+    IndexBuildInProgress,
+    _build_partitioned_index,
+    _row_count,
+    needs_rebuild,
+    parse_reloptions,
+    rebuild_index,
+    recommended_params,
+)
+
+
+def make_status(rows, lists=100, rows_at_build=None, method="ivfflat"):
+    last_build = None if rows_at_build is None else {"rows_at_build": rows_at_build}
+    return {
+        "rows": rows,
+        "index": {"name": "embeddings_vector_idx", "method": method, "params": {"lists": lists}},
+        "last_build": last_build,
+        "drift": abs(rows - (rows_at_build or 0)) / max(rows_at_build or 0, 1),
+        "recommended": recommended_params(rows, method),
+    }
+
+
+def test_recommended_lists_is_sqrt_of_rows():
+    """ivfflat lists scale with the square root of the row count."""
+    assert recommended_params(0) == {"lists": 1}
+    assert recommended_params(10_000) == {"lists": 100}
+    assert recommended_params(4_000_000) == {"lists": 2000}
+    assert recommended_params(1_000_000, "hnsw") == {"m": 16, "ef_construction": 64}
+
+
+def test_parse_reloptions():
+    assert parse_reloptions(["lists=100"]) == {"lists": 100}
+    assert parse_reloptions(None) == {}
+
+
+def test_small_tables_are_left_alone():
+    assert needs_rebuild(make_status(rows=500), min_rows=1000) is None
+
+
+def test_index_built_on_empty_table_is_rebuilt():
+    """The init script's index was trained on no data and has no recorded build."""
+    assert needs_rebuild(make_status(rows=10_000)) == "never_built_with_data"
+
+
+def test_drift_triggers_rebuild():
+    assert needs_rebuild(make_status(rows=10_000, rows_at_build=10_000)) is None
+    assert needs_rebuild(make_status(rows=20_000, rows_at_build=10_000)) == "drift"
+
+
+def test_mis_sized_lists_trigger_rebuild():
+    status = make_status(rows=1_000_000, lists=100, rows_at_build=900_000)
+    assert needs_rebuild(status) == "lists_out_of_range"
+
+
+def test_missing_index():
+    status = make_status(rows=10_000)
+    status["index"] = None
+    assert needs_rebuild(status) == "missing"
+
+
+class BuildConn:
+    """AUTOCOMMIT connection stub that answers the advisory lock query."""
+
+    def __init__(self, locked):
+        self.locked = locked
+        self.statements = []
+
+    def execution_options(self, **options):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, query, params=None):
+        self.statements.append(query)
+        return SimpleNamespace(fetchone=lambda: SimpleNamespace(locked=self.locked))
+
+
+class TreeConn(BuildConn):
+    """Build connection that reports a two-level partition tree."""
+
+    def __init__(self, tree):
+        super().__init__(locked=True)
+        self.tree = tree
+
+    def execute(self, query, params=None):
+        self.statements.append(query)
+        rows = self.tree if "ORDER BY level" in query else []
+        return SimpleNamespace(fetchall=lambda: rows)
+
+
+def build_engine(conn):
+    return SimpleNamespace(connect=lambda: conn)
+
+
+@pytest.fixture
+def plain_text(monkeypatch):
+    monkeypatch.setattr(sqlalchemy, "text", lambda sql: sql)
+
+
+def test_rebuild_refuses_when_another_replica_holds_the_lock(plain_text):
+    conn = BuildConn(locked=False)
+    with pytest.raises(IndexBuildInProgress):
+        rebuild_index(build_engine(conn))
+    assert len(conn.statements) == 1
+    assert "pg_try_advisory_lock" in conn.statements[0]
+
+
+def test_rebuild_resets_session_and_unlocks_on_failure(plain_text, monkeypatch):
+    monkeypatch.setattr(index_manager, "index_status", lambda conn: {"index": None})
+    conn = BuildConn(locked=True)
+
+    with pytest.raises(ValueError):
+        rebuild_index(build_engine(conn), method="bogus")
+
+    assert conn.statements[-3:] == [
+        "RESET maintenance_work_mem",
+        "RESET max_parallel_maintenance_workers",
+        "SELECT pg_advisory_unlock(hashtext(:key))",
+    ]
+
+
+def test_partitioned_build_never_locks_the_whole_table(plain_text):
+    """The parent index is created ON ONLY and each leaf is built concurrently, then attached."""
+
+    def part(relname, oid, parent, isleaf, level):
+        return SimpleNamespace(relname=relname, oid=oid, parent=parent, isleaf=isleaf, level=level)
+
+    conn = TreeConn([
+        part("embeddings", 1, None, False, 0),
+        part("embeddings_p_acme", 2, 1, False, 1),
+        part("embeddings_p_acme_20250301", 3, 2, True, 2),
+    ])
+
+    _build_partitioned_index(conn, "idx_new", "USING ivfflat (embedding vector_cosine_ops)")
+
+    ddl = [s for s in conn.statements if s.startswith(("CREATE", "ALTER"))]
+    assert ddl[0] == "CREATE INDEX idx_new ON ONLY embeddings USING ivfflat (embedding vector_cosine_ops)"
+    assert ddl[1].startswith("CREATE INDEX idx_new_2_") and " ON ONLY embeddings_p_acme " in ddl[1]
+    assert ddl[2] == f"ALTER INDEX idx_new ATTACH PARTITION {ddl[1].split()[2]}"
+    assert ddl[3].startswith("CREATE INDEX CONCURRENTLY idx_new_3_")
+    assert ddl[3].split(" ON ")[1].startswith("embeddings_p_acme_20250301 ")
+    assert ddl[4] == f"ALTER INDEX {ddl[1].split()[2]} ATTACH PARTITION {ddl[3].split()[3]}"
+    assert not any(s.startswith("CREATE INDEX CONCURRENTLY") and "ON ONLY" in s for s in ddl)
+
+
+def test_row_count_sums_leaf_partitions(plain_text):
+    """Leaf estimates are used because a partitioned parent's reltuples goes stale."""
+
+    class LeafConn:
+        def __init__(self):
+            self.statements = []
+
+        def execute(self, query, params=None):
+            self.statements.append(query)
+            if "pg_partition_tree" in query:
+                leaves = [
+                    SimpleNamespace(name="embeddings_p_a", n=1200),
+                    SimpleNamespace(name="embeddings_p_b", n=-1),
+                ]
+                return SimpleNamespace(fetchall=lambda: leaves)
+            return SimpleNamespace(fetchone=lambda: SimpleNamespace(n=30))
+
+    conn = LeafConn()
+    assert _row_count(conn) == 1230
+    assert conn.statements[-1] == "SELECT count(*) AS n FROM embeddings_p_b"
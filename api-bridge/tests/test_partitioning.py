@@ -0,0 +1,167 @@
+"""
+Tests for partitioned embeddings storage.
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+import sqlalchemy
+
+from partitioning import PartitionLayout, period_bounds, search_partitions, tenant_slug
+
+
+class RecordingConn:
+    """Connection stub that records SQL and returns canned rows per partition."""
+
+    def __init__(self, rows_by_table=None):
+        self.statements = []
+        self.rows_by_table = rows_by_table or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, query, params=None):
+        self.statements.append(query)
+        for table, rows in self.rows_by_table.items():
+            if f"FROM {table}\n" in query:
+                return rows
+        return []
+
+
+@pytest.fixture(autouse=True)
+def plain_text(monkeypatch):
+    """Let tests inspect SQL strings instead of mocked text() clauses."""
+    monkeypatch.setattr(sqlalchemy, "text", lambda sql: sql)
+
+
+def test_period_bounds():
+    ts = datetime(2025, 12, 17, 15, 30)
+    assert period_bounds(ts, "month") == (datetime(2025, 12, 1), datetime(2026, 1, 1))
+    assert period_bounds(ts, "week") == (datetime(2025, 12, 15), datetime(2025, 12, 22))
+    assert period_bounds(ts, "day") == (datetime(2025, 12, 17), datetime(2025, 12, 18))
+
+
+def test_tenant_slug_is_identifier_safe_and_distinct():
+    assert tenant_slug("Acme Corp!").startswith("acme_corp_")
+    assert tenant_slug("a-b") != tenant_slug("a_b")
+    assert len(tenant_slug("x" * 200)) <= 25
+
+
+def test_layout_from_setting():
+    layout = PartitionLayout.from_setting("tenant, time")
+    assert layout.by_tenant and layout.by_time
+    assert layout.unique_columns == "tenant, content_hash, created_at"
+    assert layout.conflict_target is None
+    assert PartitionLayout.from_setting("tenant").conflict_target == "(tenant, content_hash)"
+    assert not PartitionLayout.from_setting("").enabled
+    with pytest.raises(ValueError):
+        PartitionLayout.from_setting("region")
+
+
+def test_ensure_partitions_creates_tenant_and_time_levels():
+    layout = PartitionLayout(by_tenant=True, by_time=True)
+    conn = RecordingConn()
+
+    layout.ensure_partitions(conn, [("acme", datetime(2025, 3, 9))])
+
+    ddl = [s for s in conn.statements if s.startswith("CREATE TABLE IF NOT EXISTS embeddings_p")]
+    slug = tenant_slug("acme")
+    assert ddl[0] == (
+        f"CREATE TABLE IF NOT EXISTS embeddings_p_{slug} PARTITION OF embeddings "
+        "FOR VALUES IN ('acme') PARTITION BY RANGE (created_at)"
+    )
+    assert ddl[1] == (
+        f"CREATE TABLE IF NOT EXISTS embeddings_p_{slug}_20250301 PARTITION OF embeddings_p_{slug} "
+        "FOR VALUES FROM ('2025-03-01T00:00:00') TO ('2025-04-01T00:00:00')"
+    )
+
+
+def test_ensure_partitions_skips_registered_partitions():
+    """Known partitions don't run CREATE TABLE, which would lock the parent."""
+    layout = PartitionLayout(by_tenant=True, by_time=True)
+    slug = tenant_slug("acme")
+    conn = RecordingConn({"embeddings_partitions": [SimpleNamespace(name=f"embeddings_p_{slug}")]})
+
+    layout.ensure_partitions(conn, [("acme", datetime(2025, 3, 9)), ("acme", datetime(2025, 3, 20))])
+
+    ddl = [s for s in conn.statements if s.startswith("CREATE TABLE IF NOT EXISTS embeddings_p")]
+    assert ddl == [
+        f"CREATE TABLE IF NOT EXISTS embeddings_p_{slug}_20250301 PARTITION OF embeddings_p_{slug} "
+        "FOR VALUES FROM ('2025-03-01T00:00:00') TO ('2025-04-01T00:00:00')"
+    ]
+
+
+def test_search_partitions_merges_global_top_k():
+    """Each partition returns its own top-k; the merge keeps the best overall."""
+
+    def row(id, similarity):
+        return SimpleNamespace(id=id, content=str(id), metadata=None, similarity=similarity)
+
+    conn = RecordingConn({
+        "p1": [row(1, 0.95), row(2, 0.80)],
+        "p2": [row(3, 0.90), row(4, 0.85)],
+    })
+    engine = SimpleNamespace(connect=lambda: conn)
+
+    results = search_partitions(engine, ["p1", "p2"], "[0.1]", limit=3, threshold=0.5)
+
+    assert [r["id"] for r in results] == [1, 3, 4]
+    assert search_partitions(engine, [], "[0.1]", limit=3, threshold=0.5) == []
+
+
+class EmptyResult(list):
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+
+class MigrationConn(RecordingConn):
+    """Connection stub answering the migration's catalog and copy queries."""
+
+    def __init__(self, rows, leaves, copied_up_to=None):
+        super().__init__()
+        self.answers = [
+            ("relkind", SimpleNamespace(relkind="r")),
+            ("to_regclass", SimpleNamespace(t="embeddings_partitioned" if copied_up_to else None)),
+            ("max(id)", SimpleNamespace(id=copied_up_to)),
+            ("atttypmod", SimpleNamespace(dimension=768)),
+            ("pg_partition_tree", SimpleNamespace(n=leaves)),
+            ("count(*)", SimpleNamespace(n=rows)),
+        ]
+        self.copy_params = []
+
+    def execute(self, query, params=None):
+        self.statements.append(query)
+        if "INSERT INTO embeddings_partitioned" in query:
+            self.copy_params.append(params)
+            return SimpleNamespace(fetchall=lambda: [])
+        if "SELECT DISTINCT" in query:
+            groups = [SimpleNamespace(tenant="a", period=datetime(2025, 3, 1))]
+            return SimpleNamespace(fetchall=lambda: groups)
+        for marker, row in self.answers:
+            if marker in query:
+                return SimpleNamespace(fetchone=lambda row=row: row)
+        return EmptyResult()
+
+    def commit(self):
+        pass
+
+
+def test_migration_sizes_lists_per_partition_and_resumes():
+    conn = MigrationConn(rows=10_000, leaves=4, copied_up_to=500)
+    layout = PartitionLayout(by_tenant=True)
+
+    plan = layout.migrate(SimpleNamespace(connect=lambda: conn), dry_run=False)
+
+    assert plan["resume_from_id"] == 500
+    assert any("CREATE TABLE IF NOT EXISTS embeddings_partitioned (" in s for s in conn.statements)
+    assert conn.copy_params[0]["last_id"] == 500
+    # 10,000 rows over 4 partitions: sqrt(2,500) lists, as index_status recommends
+    index_ddl = next(s for s in conn.statements if "CREATE INDEX embeddings_vector_idx" in s)
+    assert "lists = 50" in index_ddl
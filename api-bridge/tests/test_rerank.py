@@ -0,0 +1,77 @@
+"""
+Tests for MMR re-ranking of vector search candidates.
+"""
+
+import main
+from rerank import mmr_rerank
+
+QUERY = [1.0, 0.0, 0.0]
+
+
+def candidate(id, embedding, source="docs"):
+    similarity = embedding[0] / sum(x * x for x in embedding) ** 0.5
+    return {
+        "id": id,
+        "content": f"chunk {id}",
+        "similarity": similarity,
+        "metadata": {"source": source},
+        "embedding": "[" + ",".join(map(str, embedding)) + "]",
+    }
+
+
+CANDIDATES = [
+    candidate(1, [1.0, 0.1, 0.0], "a"),
+    candidate(2, [1.0, 0.1, 0.001], "a"),  # near-duplicate of 1
+    candidate(3, [0.9, 0.0, 0.5], "a"),
+    candidate(4, [0.8, -0.6, 0.0], "b"),
+]
+
+
+def ids(results):
+    return [r["id"] for r in results]
+
+
+def test_pure_relevance_keeps_similarity_order():
+    assert ids(mmr_rerank(QUERY, CANDIDATES, 4, lambda_mult=1.0)) == [1, 2, 3, 4]
+
+
+def test_mmr_prefers_diverse_results():
+    """The near-duplicate of the best hit is pushed behind more diverse candidates."""
+    assert ids(mmr_rerank(QUERY, CANDIDATES, 3, lambda_mult=0.5)) == [1, 4, 3]
+
+
+def test_near_duplicates_are_dropped():
+    results = mmr_rerank(QUERY, CANDIDATES, 4, lambda_mult=1.0, duplicate_threshold=0.99)
+    assert ids(results) == [1, 3, 4]
+
+
+def test_per_source_cap():
+    results = mmr_rerank(QUERY, CANDIDATES, 4, lambda_mult=1.0, max_per_source=1)
+    assert ids(results) == [1, 4]
+
+
+def test_candidates_without_source_are_not_capped():
+    unlabeled = [dict(c, metadata={}) for c in CANDIDATES[:3]] + [CANDIDATES[3]]
+    unlabeled[1]["metadata"] = {"source": None}
+    results = mmr_rerank(QUERY, unlabeled, 4, lambda_mult=1.0, max_per_source=1)
+    assert ids(results) == [1, 2, 3, 4]
+
+
+def test_embeddings_are_not_returned():
+    results = mmr_rerank(QUERY, CANDIDATES, 2)
+    assert all("embedding" not in r for r in results)
+    assert mmr_rerank(QUERY, [], 5) == []
+
+
+def test_search_fetches_wider_candidate_set(monkeypatch):
+    calls = []
+
+    def fake_search(engine, query_vector, limit, *args, with_embeddings=False):
+        calls.append((limit, with_embeddings))
+        return CANDIDATES[:limit]
+
+    monkeypatch.setattr(main, "_search_vectors_on", fake_search)
+    results = main.search_vectors(QUERY, 2, 0.0, rerank={"lambda_mult": 0.5, "fetch_k": 4})
+
+    assert calls == [(4, True)]
+    assert ids(results) == [1, 4]
@@ -0,0 +1,228 @@
+"""
+Tests for content-hash deduplication and idempotent upserts.
+"""
+
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+import pytest
+import sqlalchemy
+
+from embedding_batcher import EmbeddingBatcher
+import main
+from partitioning import PartitionLayout
+from vector_store import DimensionMismatch, content_hash, upsert_embeddings
+
+client = TestClient(main.app)
+
+
+class FakeConn:
+    """Connection stub returning queued rows from execute().fetchone()."""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.queries = []
+        self.params = []
+
+    def execute(self, query, params=None):
+        self.queries.append(query)
+        self.params.append(params)
+        row = self.rows.pop(0)
+        return SimpleNamespace(fetchone=lambda: row)
+
+
+class DDLConn:
+    """Separate connection used for partition DDL."""
+
+    def execution_options(self, **options):
+        self.options = options
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+def test_content_hash_is_namespaced_by_source():
+    """Same text from different sources gets different hashes."""
+    assert content_hash("hello") == content_hash("hello", {"other": 1})
+    assert content_hash("hello", {"source": "a.pdf"}) != content_hash("hello", {"source": "b.pdf"})
+
+
+def test_content_hash_matches_sql_source_text():
+    """Non-string sources hash like COALESCE(metadata->>'source', '') renders them."""
+    assert content_hash("hello", {"source": None}) == content_hash("hello")
+    assert content_hash("hello", {"source": True}) == content_hash("hello", {"source": "true"})
+    assert content_hash("hello", {"source": 3}) == content_hash("hello", {"source": "3"})
+    assert content_hash("hello", {"source": {"bb": 1, "a": [1, "x"]}}) == content_hash(
+        "hello", {"source": '{"a": [1, "x"], "bb": 1}'}
+    )
+
+
+def test_upsert_reports_inserted_skipped_and_updated():
+    """Statuses follow the RETURNING row (or its absence on DO NOTHING)."""
+    conn = FakeConn([
+        SimpleNamespace(dimension=2),
+        SimpleNamespace(id=1, inserted=True),
+        None,
+        SimpleNamespace(id=1),
+    ])
+    rows = [{"content": "a", "embedding": [0.1, 0.2]}, {"content": "a", "embedding": [0.1, 0.2]}]
+
+    results = upsert_embeddings(conn, rows, on_conflict="skip")
+
+    assert [r["status"] for r in results] == ["inserted", "skipped"]
+    assert [r["id"] for r in results] == [1, 1]
+    assert conn.params[1]["embedding"] == "[0.1,0.2]"
+    assert conn.params[1]["content_hash"] == content_hash("a")
+
+    conn = FakeConn([SimpleNamespace(dimension=-1), SimpleNamespace(id=1, inserted=False)])
+    results = upsert_embeddings(conn, rows[:1], on_conflict="merge")
+    assert results[0]["status"] == "updated"
+
+
+def test_time_partitioned_upsert_locks_hash_before_lookup(monkeypatch):
+    """Without a unique index the lookup runs under a per-hash advisory lock."""
+    monkeypatch.setattr(sqlalchemy, "text", lambda sql: sql)
+    layout = PartitionLayout(by_time=True)
+    ddl_conns = []
+    monkeypatch.setattr(layout, "ensure_partitions", lambda conn, keys: ddl_conns.append(conn))
+    conn = FakeConn([SimpleNamespace(dimension=2), None, None, SimpleNamespace(id=5)])
+    conn.engine = SimpleNamespace(connect=lambda: DDLConn())
+
+    results = upsert_embeddings(conn, [{"content": "a", "embedding": [0.1, 0.2]}], layout=layout)
+
+    assert results == [{"id": 5, "content_hash": content_hash("a"), "status": "inserted"}]
+    # Partitions are created on their own autocommit connection, not in the upsert transaction
+    assert ddl_conns[0].options == {"isolation_level": "AUTOCOMMIT"}
+    assert "pg_advisory_xact_lock(hashtext(:content_hash))" in conn.queries[1]
+    assert conn.queries[2].startswith("SELECT id FROM embeddings WHERE content_hash")
+
+
+def test_upsert_rejects_wrong_dimension():
+    """768-dim vectors into a vector(1536) column fail before any insert."""
+    conn = FakeConn([SimpleNamespace(dimension=1536)])
+    with pytest.raises(DimensionMismatch, match="768 dimensions"):
+        upsert_embeddings(conn, [{"content": "a", "embedding": [0.0] * 768}])
+    assert len(conn.params) == 1
+
+
+def test_embed_and_insert_returns_400_on_dimension_mismatch(monkeypatch):
+    async def fake_embed(texts):
+        return [[1.0, 0.0] for _ in texts]
+
+    def reject(conn, rows, on_conflict, layout=None):
+        raise DimensionMismatch("Embedding has 2 dimensions but embeddings.embedding is vector(3)")
+
+    monkeypatch.setattr(
+        main, "get_embedding_batcher", lambda model=None: EmbeddingBatcher("m", fake_embed, max_wait_ms=1)
+    )
+    monkeypatch.setattr(main, "existing_ids", lambda conn, hashes, tenants=None: {})
+    monkeypatch.setattr(main, "upsert_embeddings", reject)
+
+    response = client.post("/api/v1/embed/insert", json={"items": [{"content": "x"}]})
+
+    assert response.status_code == 400
+    assert "vector(3)" in response.json()["detail"]
+
+
+def test_embed_and_insert_skips_stored_content(monkeypatch):
+    """Already stored content is neither re-embedded nor re-inserted."""
+    calls = []
+
+    async def fake_embed(texts):
+        calls.append(list(texts))
+        return [[1.0] for _ in texts]
+
+    stored_hash = content_hash("old")
+    monkeypatch.setattr(
+        main, "get_embedding_batcher", lambda model=None: EmbeddingBatcher("m", fake_embed, max_wait_ms=1)
+    )
+    monkeypatch.setattr(main, "existing_ids", lambda conn, hashes, tenants=None: {stored_hash: 7})
+    monkeypatch.setattr(
+        main,
+        "upsert_embeddings",
+        lambda conn, rows, on_conflict, layout=None: [
+            {"id": 8, "content_hash": row["content_hash"], "status": "inserted"} for row in rows
+        ],
+    )
+
+    response = client.post(
+        "/api/v1/embed/insert", json={"items": [{"content": "old"}, {"content": "new"}]}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert calls == [["new"]]
+    assert data["ids"] == [7, 8]
+    assert [r["status"] for r in data["results"]] == ["skipped", "inserted"]
+    assert data["embedded"] == 1
+
+
+def test_embed_and_insert_scopes_stored_content_per_tenant(monkeypatch):
+    """The same content stored for one tenant is still embedded and inserted for another."""
+    calls = []
+
+    async def fake_embed(texts):
+        calls.append(list(texts))
+        return [[1.0] for _ in texts]
+
+    shared_hash = content_hash("shared")
+    monkeypatch.setattr(main, "partition_layout", PartitionLayout(by_tenant=True))
+    monkeypatch.setattr(
+        main, "get_embedding_batcher", lambda model=None: EmbeddingBatcher("m", fake_embed, max_wait_ms=1)
+    )
+    monkeypatch.setattr(
+        main, "existing_ids", lambda conn, hashes, tenants=None: {("a", shared_hash): 7}
+    )
+    monkeypatch.setattr(
+        main,
+        "upsert_embeddings",
+        lambda conn, rows, on_conflict, layout=None: [
+            {"id": 8, "content_hash": row["content_hash"], "status": "inserted"} for row in rows
+        ],
+    )
+
+    response = client.post(
+        "/api/v1/embed/insert",
+        json={"items": [
+            {"content": "shared", "metadata": {"tenant": "a"}},
+            {"content": "shared", "metadata": {"tenant": "b"}},
+        ]},
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert calls == [["shared"]]
+    assert data["ids"] == [7, 8]
+    assert [r["status"] for r in data["results"]] == ["skipped", "inserted"]
+
+
+def test_embed_and_insert_reports_repeated_content_per_position(monkeypatch):
+    """The second copy of new content is skipped without hiding that the first was inserted."""
+
+    async def fake_embed(texts):
+        return [[1.0] for _ in texts]
+
+    def upsert(conn, rows, on_conflict, layout=None):
+        return [
+            {"id": 9, "content_hash": row["content_hash"], "status": "skipped" if i else "inserted"}
+            for i, row in enumerate(rows)
+        ]
+
+    monkeypatch.setattr(
+        main, "get_embedding_batcher", lambda model=None: EmbeddingBatcher("m", fake_embed, max_wait_ms=1)
+    )
+    monkeypatch.setattr(main, "existing_ids", lambda conn, hashes, tenants=None: {})
+    monkeypatch.setattr(main, "upsert_embeddings", upsert)
+
+    response = client.post(
+        "/api/v1/embed/insert", json={"items": [{"content": "same"}, {"content": "same"}]}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["status"] for r in data["results"]] == ["inserted", "skipped"]
+    assert data["ids"] == [9, 9]
@@ -0,0 +1,294 @@
+"""
+pgvector storage helpers
+Content-hash deduplication and idempotent upserts for the embeddings table
+"""
+
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+# Conflict handling for rows whose content hash already exists
+ON_CONFLICT_MODES = ("skip", "replace", "merge")
+
+# Same hash as content_hash(), computed in SQL for backfilling existing rows
+# (->> yields NULL for a JSON null and jsonb text for non-string sources)
+SQL_CONTENT_HASH = (
+    "encode(sha256(convert_to("
+    "coalesce(metadata->>'source', '') || E'\\x1f' || coalesce(content, ''), 'UTF8')), 'hex')"
+)
+
+# Assignments applied when a row with the same content hash already exists
+CONFLICT_UPDATES = {
+    "replace": "content = {new}.content, embedding = {new}.embedding, metadata = {new}.metadata",
+    "merge": (
+        "embedding = {new}.embedding, "
+        "metadata = COALESCE(embeddings.metadata, '{{}}'::jsonb) || {new}.metadata"
+    ),
+}
+
+
+def upsert_sql(
+    on_conflict: str,
+    conflict_target: str = "(content_hash)",
+    with_tenant: bool = False,
+    with_created_at: bool = False,
+) -> str:
+    """INSERT ... ON CONFLICT statement for a conflict mode"""
+    columns = "content, embedding, metadata, content_hash"
+    values = ":content, CAST(:embedding AS vector), CAST(:metadata AS jsonb), :content_hash"
+    if with_tenant:
+        columns += ", tenant"
+        values += ", :tenant"
+    if with_created_at:
+        # Set explicitly so the row lands in the partition created for it
+        columns += ", created_at"
+        values += ", :created_at"
+    if on_conflict == "skip":
+        action = "DO NOTHING"
+        returning = "id, true AS inserted"
+    else:
+        action = "DO UPDATE SET " + CONFLICT_UPDATES[on_conflict].format(new="EXCLUDED")
+        returning = "id, (xmax = 0) AS inserted"
+    return f"""
+        INSERT INTO embeddings ({columns})
+        VALUES ({values})
+        ON CONFLICT {conflict_target} {action}
+        RETURNING {returning}
+    """
+
+
+class DimensionMismatch(ValueError):
+    """Raised when embeddings don't fit the dimension of the ``embedding`` column"""
+
+
+def embedding_dimension(conn) -> Optional[int]:
+    """Declared dimension of ``embeddings.embedding``, or None if unconstrained"""
+    from sqlalchemy import text
+
+    row = conn.execute(
+        text("""
+            SELECT atttypmod AS dimension FROM pg_attribute
+            WHERE attrelid = 'embeddings'::regclass AND attname = 'embedding'
+        """)
+    ).fetchone()
+    if row is None or row.dimension <= 0:
+        return None
+    return int(row.dimension)
+
+
+def check_dimensions(conn, rows: List[Dict[str, Any]]) -> None:
+    """Reject rows whose embedding length differs from the column dimension"""
+    if not rows:
+        return
+    dimension = embedding_dimension(conn)
+    if dimension is None:
+        return
+    wrong = sorted({len(row["embedding"]) for row in rows} - {dimension})
+    if wrong:
+        raise DimensionMismatch(
+            f"Embedding has {wrong[0]} dimensions but embeddings.embedding is vector({dimension}); "
+            "use a model with matching output size or change the column dimension"
+        )
+
+
+def _jsonb_text(value: Any) -> str:
+    """JSON text of a value the way Postgres prints jsonb (key order, separators)"""
+    if isinstance(value, dict):
+        # jsonb orders object keys by length, then bytewise
+        keys = sorted(value, key=lambda k: (len(str(k).encode("utf-8")), str(k).encode("utf-8")))
+        return "{" + ", ".join(
+            f"{json.dumps(str(k), ensure_ascii=False)}: {_jsonb_text(value[k])}" for k in keys
+        ) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(_jsonb_text(v) for v in value) + "]"
+    return json.dumps(value, ensure_ascii=False)
+
+
+def source_text(metadata: Optional[Dict[str, Any]]) -> str:
+    """``metadata["source"]`` as ``COALESCE(metadata->>'source', '')`` returns it in SQL"""
+    source = (metadata or {}).get("source")
+    if source is None:
+        return ""
+    if isinstance(source, str):
+        return source
+    return _jsonb_text(source)
+
+
+def content_hash(content: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+    """Hash of the content, namespaced by ``metadata["source"]`` when present"""
+    return hashlib.sha256(f"{source_text(metadata)}\x1f{content}".encode("utf-8")).hexdigest()
+
+
+def to_vector_literal(embedding: Iterable[float]) -> str:
+    return "[" + ",".join(map(str, embedding)) + "]"
+
+
+def existing_ids(conn, hashes: List[str], tenants: Optional[List[str]] = None) -> Dict[Any, int]:
+    """
+    Map the hashes that are already stored to their row ids.
+
+    With ``tenants`` the lookup is scoped per tenant and the keys are
+    ``(tenant, hash)`` pairs, since the same content may be stored once per tenant.
+    """
+    from sqlalchemy import text
+
+    if not hashes:
+        return {}
+    if tenants is None:
+        result = conn.execute(
+            text("SELECT id, content_hash FROM embeddings WHERE content_hash = ANY(:hashes)"),
+            {"hashes": hashes},
+        )
+        return {row.content_hash: row.id for row in result}
+
+    wanted = set(zip(hashes, tenants))
+    result = conn.execute(
+        text("""
+            SELECT id, content_hash, tenant FROM embeddings
+            WHERE content_hash = ANY(:hashes) AND tenant = ANY(:tenants)
+        """),
+        {"hashes": hashes, "tenants": sorted(set(tenants))},
+    )
+    return {
+        (row.tenant, row.content_hash): row.id
+        for row in result if (row.content_hash, row.tenant) in wanted
+    }
+
+
+def upsert_embeddings(
+    conn, rows: List[Dict[str, Any]], on_conflict: str = "skip", layout=None
+) -> List[Dict[str, Any]]:
+    """
+    Insert rows of ``content``, ``embedding`` and ``metadata``, deduplicated by content hash.
+
+    Returns one ``{"id", "content_hash", "status"}`` per row, where status is
+    ``inserted``, ``updated`` or ``skipped``. With a partitioned ``layout`` the
+    target partitions are created first, in their own transaction, and hashes
+    are scoped per tenant.
+    Raises ``DimensionMismatch`` if an embedding doesn't fit the column.
+    The caller commits.
+    """
+    from sqlalchemy import text
+
+    if on_conflict not in ON_CONFLICT_MODES:
+        raise ValueError(f"on_conflict must be one of {', '.join(ON_CONFLICT_MODES)}")
+    check_dimensions(conn, rows)
+
+    partitioned = layout is not None and layout.enabled
+    with_tenant = partitioned and layout.by_tenant
+    conflict_target = layout.conflict_target if partitioned else "(content_hash)"
+    tenant_clause = " AND tenant = :tenant" if with_tenant else ""
+    lookup = text(f"SELECT id FROM embeddings WHERE content_hash = :content_hash{tenant_clause}")
+
+    if conflict_target is None:
+        # Uniqueness can't be enforced across time partitions: look up, then write.
+        # A transaction-level advisory lock per hash keeps concurrent writers of
+        # the same content from both missing the lookup and inserting twice.
+        hash_lock = text("SELECT pg_advisory_xact_lock(hashtext(:content_hash))")
+        insert_sql = upsert_sql("skip", with_tenant=with_tenant, with_created_at=True)
+        insert = text(insert_sql.split("ON CONFLICT")[0] + "RETURNING id")
+        update = None
+        if on_conflict != "skip":
+            assignments = CONFLICT_UPDATES[on_conflict].format(new="new")
+            update = text(f"""
+                UPDATE embeddings SET {assignments}
+                FROM (SELECT :content AS content, CAST(:embedding AS vector) AS embedding,
+                             CAST(:metadata AS jsonb) AS metadata) new
+                WHERE embeddings.id = :id
+            """)
+    else:
+        query = text(upsert_sql(on_conflict, conflict_target, with_tenant))
+
+    now = datetime.now()
+    if partitioned:
+        # New partitions lock the parent until commit: create them in their own
+        # short transaction rather than holding that lock for the whole upsert
+        keys = {(layout.tenant_for(row.get("metadata")), now) for row in rows}
+        with conn.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as ddl_conn:
+            layout.ensure_partitions(ddl_conn, keys)
+
+    results = []
+    for row in rows:
+        metadata = row.get("metadata") or {}
+        row_hash = row.get("content_hash") or content_hash(row["content"], metadata)
+        params = {
+            "content": row["content"],
+            "embedding": to_vector_literal(row["embedding"]),
+            "metadata": json.dumps(metadata),
+            "content_hash": row_hash,
+            "created_at": now,
+        }
+        if with_tenant:
+            params["tenant"] = layout.tenant_for(metadata)
+
+        if conflict_target is None:
+            conn.execute(hash_lock, params)
+            existing = conn.execute(lookup, params).fetchone()
+            if existing is None:
+                returned = conn.execute(insert, params).fetchone()
+                results.append({"id": returned.id, "content_hash": row_hash, "status": "inserted"})
+            elif update is None:
+                results.append({"id": existing.id, "content_hash": row_hash, "status": "skipped"})
+            else:
+                conn.execute(update, {**params, "id": existing.id})
+                results.append({"id": existing.id, "content_hash": row_hash, "status": "updated"})
+            continue
+
+        returned = conn.execute(query, params).fetchone()
+        if returned is None:
+            existing = conn.execute(lookup, params).fetchone()
+            results.append({"id": existing.id, "content_hash": row_hash, "status": "skipped"})
+        else:
+            status = "inserted" if returned.inserted else "updated"
+            results.append({"id": returned.id, "content_hash": row_hash, "status": status})
+    return results
+
+
+def dedup_embeddings(conn, dry_run: bool = True) -> Dict[str, Any]:
+    """
+    Offline dedup for tables created before content hashing.
+
+    Adds and backfills ``content_hash``, removes duplicate rows (keeping the
+    oldest id) and creates the unique index that upserts rely on. The caller
+    commits; with ``dry_run`` only the counts are reported.
+    """
+    from sqlalchemy import text
+
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = 'embeddings'::regclass")
+    ).fetchone().relkind
+    if relkind == "p":
+        # Partitioned tables get their unique index from the partition migration
+        raise ValueError("embeddings is partitioned; run dedup before migrating to partitions")
+
+    conn.execute(text("ALTER TABLE embeddings ADD COLUMN IF NOT EXISTS content_hash TEXT"))
+    missing = conn.execute(
+        text("SELECT count(*) AS n FROM embeddings WHERE content_hash IS NULL")
+    ).fetchone().n
+    duplicates = conn.execute(
+        text(f"""
+            SELECT count(*) - count(DISTINCT h) AS n
+            FROM (SELECT COALESCE(content_hash, {SQL_CONTENT_HASH}) AS h FROM embeddings) t
+        """)
+    ).fetchone().n
+
+    report = {"rows_missing_hash": missing, "duplicate_rows": duplicates, "dry_run": dry_run}
+    if dry_run:
+        return report
+
+    conn.execute(
+        text(f"UPDATE embeddings SET content_hash = {SQL_CONTENT_HASH} WHERE content_hash IS NULL")
+    )
+    deleted = conn.execute(
+        text("""
+            DELETE FROM embeddings e
+            USING embeddings d
+            WHERE e.content_hash = d.content_hash AND e.id > d.id
+        """)
+    ).rowcount
+    conn.execute(
+        text("CREATE UNIQUE INDEX IF NOT EXISTS embeddings_content_hash_idx ON embeddings (content_hash)")
+    )
+    report["deleted_rows"] = deleted
+    return report
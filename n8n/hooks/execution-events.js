@@ -0,0 +1,88 @@
+/**
+ * n8n external hook: publish execution results to Redis
+ *
+ * Loaded through EXTERNAL_HOOK_FILES. When an execution finishes, a message
+ * such as {"executionId": "42", "status": "success"} is published on
+ * EXECUTION_EVENTS_CHANNEL so api-bridge can push the final status to SSE and
+ * GraphQL subscribers without waiting for its next poll.
+ *
+ * Publishing is enabled when EXECUTION_EVENTS_REDIS_URL is set, or in queue
+ * mode (EXECUTIONS_MODE=queue) using the QUEUE_BULL_REDIS_* connection.
+ * Otherwise the hook does nothing and api-bridge relies on polling alone.
+ */
+
+const CHANNEL = process.env.EXECUTION_EVENTS_CHANNEL || 'n8n:execution-events';
+
+function redisOptions() {
+  if (process.env.EXECUTION_EVENTS_REDIS_URL) {
+    return process.env.EXECUTION_EVENTS_REDIS_URL;
+  }
+  if (process.env.EXECUTIONS_MODE !== 'queue') {
+    return null;
+  }
+  return {
+    host: process.env.QUEUE_BULL_REDIS_HOST || 'localhost',
+    port: Number(process.env.QUEUE_BULL_REDIS_PORT || 6379),
+    password: process.env.QUEUE_BULL_REDIS_PASSWORD || undefined,
+    db: Number(process.env.QUEUE_BULL_REDIS_DB || 0),
+  };
+}
+
+let client;
+
+function getClient() {
+  if (client !== undefined) {
+    return client;
+  }
+  const options = redisOptions();
+  if (options === null) {
+    client = null;
+    return client;
+  }
+  // ioredis ships with n8n (queue mode); resolve it from the n8n installation
+  const Redis = require(require.resolve('ioredis', {
+    paths: [process.cwd(), '/usr/local/lib/node_modules/n8n'],
+  }));
+  client = typeof options === 'string'
+    ? new Redis(options, { maxRetriesPerRequest: 1 })
+    : new Redis({ ...options, maxRetriesPerRequest: 1 });
+  client.on('error', () => {});
+  return client;
+}
+
+function executionStatus(runData) {
+  if (runData && runData.status) {
+    return runData.status;
+  }
+  const error = runData && runData.data && runData.data.resultData && runData.data.resultData.error;
+  return error ? 'error' : 'success';
+}
+
+module.exports = {
+  workflow: {
+    postExecute: [
+      async function (runData, workflowData, executionId) {
+        if (!executionId) {
+          return;
+        }
+        try {
+          const redis = getClient();
+          if (!redis) {
+            return;
+          }
+          const message = {
+            executionId: String(executionId),
+            status: executionStatus(runData),
+            workflow_id: workflowData && workflowData.id ? String(workflowData.id) : undefined,
+            finished_at: runData && runData.stoppedAt
+              ? new Date(runData.stoppedAt).toISOString()
+              : new Date().toISOString(),
+          };
+          await redis.publish(CHANNEL, JSON.stringify(message));
+        } catch (error) {
+          // Subscribers fall back to polling; never fail the execution over this
+        }
+      },
+    ],
+  },
+};
@@ -0,0 +1,13 @@
+"""
+Pytest configuration for the Python worker tests.
+"""
+
+import os
+import sys
+import tempfile
+
+# Point the worker at a scratch scripts directory before it is imported
+os.environ["PY_WORKER_SCRIPTS_DIR"] = tempfile.mkdtemp(prefix="py-worker-scripts-")
+os.environ.setdefault("PY_WORKER_PRELOAD", "")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
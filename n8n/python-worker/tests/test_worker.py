@@ -0,0 +1,168 @@
+"""
+Tests for the persistent Python worker.
+"""
+
+import io
+import json
+import os
+import sys
+import textwrap
+import threading
+from http.server import ThreadingHTTPServer
+from urllib import request as urlrequest
+
+import pytest
+
+import worker
+
+
+def write_script(name, body):
+    path = os.path.join(worker.SCRIPTS_DIR, f"{name}.py")
+    with open(path, "w") as f:
+        f.write(textwrap.dedent(body))
+    return path
+
+
+@pytest.fixture(scope="module")
+def scripts():
+    write_script("echo", """
+        import json, sys
+
+        def main():
+            print(json.dumps(json.load(sys.stdin)))
+    """)
+    write_script("sleepy", """
+        import time
+
+        def main():
+            time.sleep(10)
+    """)
+    write_script("hungry", """
+        def main():
+            raise MemoryError()
+    """)
+    write_script("batch", """
+        def process_batch(items):
+            return [item["n"] * 2 for item in items]
+    """)
+    return worker.discover_scripts(worker.SCRIPTS_DIR, "")
+
+
+def test_run_item_maps_exit_codes():
+    """SystemExit codes and a False return map onto exit_code like the CLI."""
+
+    def exits(code):
+        def entry():
+            print(json.dumps({"seen": True}))
+            sys.exit(code)
+        return entry
+
+    assert worker.run_item(exits(None), {}) == {"ok": True, "exit_code": 0, "output": {"seen": True}}
+    assert worker.run_item(exits(3), {})["exit_code"] == 3
+    assert worker.run_item(exits("fatal"), {})["exit_code"] == 1
+    assert worker.run_item(lambda: False, {}) == {"ok": False, "exit_code": 1, "output": None}
+
+
+def test_run_job_uses_process_batch(scripts):
+    result = worker.run_job(scripts, {"script": "batch", "items": [{"n": 1}, {"n": 2}]})
+    assert result["status"] == "success"
+    assert [r["output"] for r in result["results"]] == [2, 4]
+    assert worker.run_job(scripts, {"script": "missing"})["status"] == "error"
+
+
+def test_timeout_restarts_worker(scripts):
+    pool = worker.WorkerPool(processes=1, memory_mb=0)
+    try:
+        pid = pool.slots[0].process.pid
+        result = pool.run({"script": "sleepy", "items": [{}]}, timeout=0.5)
+        assert "timed out" in result["error"]
+        assert pool.timeouts == 1
+        assert pool.slots[0].process.pid != pid
+
+        # The replacement worker takes jobs normally
+        result = pool.run({"script": "echo", "items": [{"a": 1}]}, timeout=10)
+        assert result["results"][0]["output"] == {"a": 1}
+    finally:
+        pool.shutdown()
+
+
+def test_memory_error_and_job_count_recycle_worker(scripts):
+    pool = worker.WorkerPool(processes=1, memory_mb=0, max_jobs=2)
+    try:
+        pid = pool.slots[0].process.pid
+        result = pool.run({"script": "hungry", "items": [{}]}, timeout=10)
+        assert result["error"] == "Memory limit exceeded"
+        assert pool.slots[0].process.pid != pid
+
+        pid = pool.slots[0].process.pid
+        pool.run({"script": "echo", "items": [{}]}, timeout=10)
+        assert pool.slots[0].process.pid == pid
+        pool.run({"script": "echo", "items": [{}]}, timeout=10)
+        assert pool.slots[0].process.pid != pid
+        assert pool.stats()["recycled"] == 2
+    finally:
+        pool.shutdown()
+
+
+def test_http_rejects_malformed_jobs():
+    """Bad bodies get a 400 instead of an empty response."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), worker.make_handler(pool=None, preloaded=[]))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/run"
+    try:
+        for body in ([1, 2], {"script": "echo", "timeout": "soon"}, {"script": "echo", "items": "x"}):
+            req = urlrequest.Request(url, data=json.dumps(body).encode("utf-8"))
+            with pytest.raises(worker.urlerror.HTTPError) as exc:
+                urlrequest.urlopen(req, timeout=5)
+            assert exc.value.code == 400
+            assert json.load(exc.value)["status"] == "error"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_busy_pool_answers_503(scripts):
+    """Jobs wait a bounded time for an idle worker instead of outliving the client's timeout."""
+    pool = worker.WorkerPool(processes=1, memory_mb=0, queue_timeout=0.1)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), worker.make_handler(pool, preloaded=[]))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/run"
+    slot = pool.idle.get()
+    try:
+        req = urlrequest.Request(url, data=json.dumps({"script": "echo"}).encode("utf-8"))
+        with pytest.raises(worker.urlerror.HTTPError) as exc:
+            urlrequest.urlopen(req, timeout=5)
+        assert exc.value.code == 503
+        assert pool.stats()["busy"] == 1
+    finally:
+        pool.idle.put(slot)
+        server.shutdown()
+        server.server_close()
+        pool.shutdown()
+
+
+def test_cli_falls_back_only_when_daemon_is_unreachable(scripts, monkeypatch, capsys):
+    def refused(*args, **kwargs):
+        raise worker.urlerror.URLError(ConnectionRefusedError(111, "Connection refused"))
+
+    monkeypatch.setattr(worker.urlrequest, "urlopen", refused)
+    monkeypatch.setattr(sys, "stdin", io.StringIO('{"x": 1}'))
+
+    assert worker.run_cli("echo") == 0
+    assert json.loads(capsys.readouterr().out) == {"x": 1}
+
+
+def test_cli_does_not_rerun_job_after_read_timeout(scripts, monkeypatch, capsys):
+    """The daemon may still be running the job, so it must not also run locally."""
+    ran = []
+
+    def slow_daemon(*args, **kwargs):
+        raise TimeoutError("timed out")
+
+    monkeypatch.setattr(worker.urlrequest, "urlopen", slow_daemon)
+    monkeypatch.setattr(worker, "run_job", lambda *args: ran.append(args))
+    monkeypatch.setattr(sys, "stdin", io.StringIO('{"x": 1}'))
+
+    assert worker.run_cli("echo") == 1
+    assert ran == []
+    assert "did not answer" in json.loads(capsys.readouterr().out)["error"]
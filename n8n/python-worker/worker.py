@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Persistent Python Worker for n8n
+Runs n8n Python scripts in a pool of warm processes instead of one interpreter per item
+
+Scripts keep the usual read-stdin/print-JSON contract, so the same file works
+both from the Execute Command node and through this daemon:
+
+    python3 worker.py serve                    # start the daemon
+    python3 worker.py run grpc-client-example  # run stdin through the daemon (or locally)
+
+Jobs are sent as JSON to ``POST /run``:
+
+    {"script": "grpc-client-example", "items": [{...}, {...}], "timeout": 30}
+"""
+
+import argparse
+import errno
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import sys
+import time
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import error as urlerror, request as urlrequest
+
+# Configuration
+HOST = os.environ.get("PY_WORKER_HOST", "127.0.0.1")
+PORT = int(os.environ.get("PY_WORKER_PORT", "8765"))
+PROCESSES = int(os.environ.get("PY_WORKER_PROCESSES", str(os.cpu_count() or 2)))
+JOB_TIMEOUT = float(os.environ.get("PY_WORKER_TIMEOUT", "30"))
+# How long a job may wait for an idle worker before the daemon answers 503
+QUEUE_TIMEOUT = float(os.environ.get("PY_WORKER_QUEUE_TIMEOUT", "10"))
+MEMORY_MB = int(os.environ.get("PY_WORKER_MEMORY_MB", "1024"))
+# Recycle a worker after this many jobs or once its RSS exceeds this size (0 disables)
+MAX_JOBS = int(os.environ.get("PY_WORKER_MAX_JOBS", "500"))
+MAX_RSS_MB = int(os.environ.get("PY_WORKER_MAX_RSS_MB", "0"))
+PRELOAD = os.environ.get("PY_WORKER_PRELOAD", "json,numpy,pandas,grpc,openai,requests")
+SCRIPTS_DIR = os.environ.get("PY_WORKER_SCRIPTS_DIR", "/data/shared/scripts")
+# Extra registrations: "name=/path/to/script.py[:function],..."
+SCRIPTS = os.environ.get("PY_WORKER_SCRIPTS", "")
+DAEMON_URL = os.environ.get("PY_WORKER_URL", f"http://127.0.0.1:{PORT}")
+
+
+# ============================================================================
+# Script registry and execution (runs inside worker processes)
+# ============================================================================
+
+def discover_scripts(scripts_dir=SCRIPTS_DIR, extra=SCRIPTS):
+    """Map script names to (path, entry function) from the scripts dir and explicit registrations"""
+    registry = {}
+    if os.path.isdir(scripts_dir):
+        for filename in sorted(os.listdir(scripts_dir)):
+            if filename.endswith(".py"):
+                registry[filename[:-3]] = (os.path.join(scripts_dir, filename), "main")
+
+    for entry in filter(None, (part.strip() for part in extra.split(","))):
+        name, _, target = entry.partition("=")
+        path, _, function = target.partition(":")
+        registry[name.strip()] = (path.strip(), function.strip() or "main")
+    return registry
+
+
+_modules = {}
+
+
+def load_script(path):
+    """Import a script once per worker, reloading it only when the file changes"""
+    mtime = os.path.getmtime(path)
+    cached = _modules.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    name = "n8n_script_" + os.path.splitext(os.path.basename(path))[0].replace("-", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    _modules[path] = (mtime, module)
+    return module
+
+
+def run_item(entry, item):
+    """Call a stdin/stdout entry point with one item, the way the CLI would"""
+    stdin, stdout, stderr = io.StringIO(json.dumps(item)), io.StringIO(), io.StringIO()
+    exit_code = 0
+    saved_stdin = sys.stdin
+    sys.stdin = stdin
+    try:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                returned = entry()
+                if returned is False:
+                    exit_code = 1
+            except SystemExit as e:
+                exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    finally:
+        sys.stdin = saved_stdin
+
+    text = stdout.getvalue().strip()
+    try:
+        output = json.loads(text) if text else None
+    except ValueError:
+        output = text
+    return {"ok": exit_code == 0, "exit_code": exit_code, "output": output}
+
+
+def run_job(registry, job):
+    """Run a script over a batch of items"""
+    name = job.get("script")
+    if name not in registry:
+        return {"status": "error", "error": f"Unknown script: {name}"}
+    path, function = registry[name]
+
+    try:
+        module = load_script(path)
+        items = job.get("items", [])
+        # Scripts may opt into whole-batch processing for vectorized work
+        if hasattr(module, "process_batch"):
+            outputs = module.process_batch(items)
+            results = [{"ok": True, "exit_code": 0, "output": output} for output in outputs]
+        else:
+            entry = getattr(module, function)
+            results = [run_item(entry, item) for item in items]
+        return {"status": "success", "script": name, "results": results}
+    except MemoryError:
+        return {"status": "error", "error": "Memory limit exceeded", "error_type": "MemoryError", "script": name}
+    except Exception as e:
+        return {
+            "status": "error",
+            "error": str(e),
+            "error_type": type(e).__name__,
+            "traceback": traceback.format_exc(),
+            "script": name,
+        }
+
+
+def preload_modules(names=PRELOAD):
+    """Import heavy modules up front so every job starts warm"""
+    loaded = []
+    for name in filter(None, (part.strip() for part in names.split(","))):
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except Exception:
+            pass
+    return loaded
+
+
+def worker_main(conn, memory_mb):
+    """Worker process loop: receive jobs, run them, send results"""
+    if memory_mb > 0:
+        try:
+            import resource
+
+            # The cap is on top of what the preloaded modules already map
+            with open("/proc/self/statm") as f:
+                baseline = int(f.read().split()[0]) * resource.getpagesize()
+            limit = baseline + memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        conn.send(run_job(discover_scripts(), job))
+
+
+# ============================================================================
+# Process pool (runs in the daemon)
+# ============================================================================
+
+class WorkerSlot:
+    """One long-lived worker process and its pipe"""
+
+    def __init__(self, context, memory_mb):
+        self.context = context
+        self.memory_mb = memory_mb
+        self.jobs = 0
+        self.jobs_since_start = 0
+        self.start()
+
+    def start(self):
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=worker_main, args=(child_conn, self.memory_mb), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def restart(self):
+        self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+        self.jobs_since_start = 0
+        self.start()
+
+    def rss_mb(self):
+        """Resident memory of the worker process, or 0 if it can't be read"""
+        try:
+            with open(f"/proc/{self.process.pid}/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        except (OSError, ValueError, IndexError):
+            return 0
+
+
+class PoolBusy(Exception):
+    """No worker became idle within the queue timeout"""
+
+
+class WorkerPool:
+    """Fixed-size pool of warm worker processes with per-job timeouts"""
+
+    def __init__(
+        self,
+        processes=PROCESSES,
+        memory_mb=MEMORY_MB,
+        max_jobs=MAX_JOBS,
+        max_rss_mb=MAX_RSS_MB,
+        queue_timeout=QUEUE_TIMEOUT,
+    ):
+        # Forking after preload_modules() lets every worker inherit the imports
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        context = multiprocessing.get_context(method)
+        self.slots = [WorkerSlot(context, memory_mb) for _ in range(processes)]
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.queue_timeout = queue_timeout
+        self.idle = queue.Queue()
+        for slot in self.slots:
+            self.idle.put(slot)
+        self.timeouts = 0
+        self.crashes = 0
+        self.recycled = 0
+        self.busy = 0
+
+    def _should_recycle(self, slot, result):
+        # The address-space cap is per process, so memory kept by warm module
+        # state counts against every later job until the worker is replaced
+        if result.get("error_type") == "MemoryError":
+            return True
+        if self.max_jobs and slot.jobs_since_start >= self.max_jobs:
+            return True
+        return bool(self.max_rss_mb) and slot.rss_mb() > self.max_rss_mb
+
+    def run(self, job, timeout=JOB_TIMEOUT):
+        """Run a job on the next idle worker; raises PoolBusy if none frees up within the queue timeout"""
+        try:
+            slot = self.idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            self.busy += 1
+            raise PoolBusy(f"No idle worker within {self.queue_timeout}s")
+        try:
+            slot.conn.send(job)
+            if not slot.conn.poll(timeout):
+                self.timeouts += 1
+                slot.restart()
+                return {"status": "error", "error": f"Job timed out after {timeout}s", "script": job.get("script")}
+            slot.jobs += 1
+            slot.jobs_since_start += 1
+            result = slot.conn.recv()
+            if self._should_recycle(slot, result):
+                self.recycled += 1
+                slot.restart()
+            return result
+        except (EOFError, OSError, BrokenPipeError):
+            # The worker died (e.g. killed for exceeding its memory cap)
+            self.crashes += 1
+            slot.restart()
+            return {"status": "error", "error": "Worker process crashed", "script": job.get("script")}
+        finally:
+            self.idle.put(slot)
+
+    def stats(self):
+        return {
+            "processes": len(self.slots),
+            "idle": self.idle.qsize(),
+            "jobs": sum(slot.jobs for slot in self.slots),
+            "timeouts": self.timeouts,
+            "crashes": self.crashes,
+            "recycled": self.recycled,
+            "busy": self.busy,
+        }
+
+    def shutdown(self):
+        for slot in self.slots:
+            slot.process.kill()
+
+
+# ============================================================================
+# HTTP daemon
+# ============================================================================
+
+def make_handler(pool, preloaded):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            payload = json.dumps(body, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, {"status": "healthy", "service": "python-worker", "preloaded": preloaded, **pool.stats()})
+            elif self.path == "/scripts":
+                self._send(200, {"scripts": {name: path for name, (path, _) in discover_scripts().items()}})
+            else:
+                self._send(404, {"status": "error", "error": "Not found"})
+
+        def do_POST(self):
+            if self.path != "/run":
+                self._send(404, {"status": "error", "error": "Not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                job = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError as e:
+                self._send(400, {"status": "error", "error": "Invalid JSON input", "details": str(e)})
+                return
+            if not isinstance(job, dict):
+                self._send(400, {"status": "error", "error": "Job must be a JSON object"})
+                return
+
+            if "items" not in job:
+                job["items"] = [job.get("item", {})]
+            if not isinstance(job["items"], list):
+                self._send(400, {"status": "error", "error": "items must be a list"})
+                return
+            try:
+                timeout = float(job.pop("timeout", JOB_TIMEOUT))
+            except (TypeError, ValueError):
+                self._send(400, {"status": "error", "error": "timeout must be a number"})
+                return
+            if timeout <= 0:
+                self._send(400, {"status": "error", "error": "timeout must be positive"})
+                return
+            started = time.monotonic()
+            try:
+                result = pool.run(job, timeout=timeout)
+            except PoolBusy as e:
+                self._send(503, {"status": "error", "error": str(e), "script": job.get("script")})
+                return
+            result["duration_ms"] = round((time.monotonic() - started) * 1000, 2)
+            self._send(200 if result.get("status") == "success" else 500, result)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host=HOST, port=PORT):
+    preloaded = preload_modules()
+    pool = WorkerPool()
+    server = ThreadingHTTPServer((host, port), make_handler(pool, preloaded))
+    print(json.dumps({"status": "listening", "host": host, "port": port, "preloaded": preloaded}), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.shutdown()
+
+
+# ============================================================================
+# CLI client
+# ============================================================================
+
+def _daemon_unreachable(error):
+    """Whether the job never reached the daemon, so running it locally can't run it twice"""
+    reason = getattr(error, "reason", None)
+    if isinstance(reason, (ConnectionRefusedError, socket.gaierror)):
+        return True
+    return isinstance(reason, OSError) and reason.errno in (errno.ENETUNREACH, errno.EHOSTUNREACH)
+
+
+def run_cli(script, url=DAEMON_URL, timeout=JOB_TIMEOUT):
+    """
+    Send stdin to the daemon, falling back to running the script in-process.
+
+    The fallback is only used when the daemon can't be reached. Once the job
+    has been sent the daemon may still run it, so a slow or failed answer is
+    reported as an error instead of running a non-idempotent script twice.
+    """
+    raw = sys.stdin.read()
+    data = json.loads(raw) if raw.strip() else {}
+    single = not isinstance(data, list)
+    job = {"script": script, "items": [data] if single else data, "timeout": timeout}
+
+    try:
+        req = urlrequest.Request(
+            f"{url}/run",
+            data=json.dumps(job).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        # The daemon may queue the job for up to QUEUE_TIMEOUT before running it
+        with urlrequest.urlopen(req, timeout=timeout + QUEUE_TIMEOUT + 5) as response:
+            result = json.load(response)
+    except urlerror.HTTPError as e:
+        result = json.load(e)
+    except urlerror.URLError as e:
+        if not _daemon_unreachable(e):
+            result = {"status": "error", "error": f"Worker daemon failed: {e.reason}", "script": script}
+        else:
+            result = run_job(discover_scripts(), job)
+    except (OSError, ValueError) as e:
+        # Read timeouts and dropped connections happen after the job was sent
+        result = {"status": "error", "error": f"Worker daemon did not answer: {e}", "script": script}
+
+    if result.get("status") != "success":
+        print(json.dumps(result))
+        return 1
+
+    outputs = [r["output"] for r in result["results"]]
+    print(json.dumps(outputs[0] if single else outputs))
+    return 0 if all(r["ok"] for r in result["results"]) else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent Python worker for n8n")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subcommands.add_parser("serve", help="Run the worker daemon")
+    serve_parser.add_argument("--host", default=HOST)
+    serve_parser.add_argument("--port", type=int, default=PORT)
+
+    run_parser = subcommands.add_parser("run", help="Run a registered script on stdin JSON")
+    run_parser.add_argument("script")
+    run_parser.add_argument("--url", default=DAEMON_URL)
+    run_parser.add_argument("--timeout", type=float, default=JOB_TIMEOUT)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args.host, args.port)
+    else:
+        sys.exit(run_cli(args.script, args.url, args.timeout))
+
+
+if __name__ == "__main__":
+    main()
@@ -8,12 +8,18 @@ CREATE EXTENSION IF NOT EXISTS vector;
 CREATE TABLE IF NOT EXISTS embeddings (
     id SERIAL PRIMARY KEY,
     content TEXT,
-    embedding vector(1536),  -- OpenAI ada-002 dimension
+    embedding vector(768),  -- nomic-embed-text (api-bridge default EMBEDDING_MODEL)
     metadata JSONB,
+    content_hash TEXT,  -- sha256 of metadata.source + content, for idempotent upserts
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Unique content hash so re-ingestion upserts instead of duplicating rows
+CREATE UNIQUE INDEX IF NOT EXISTS embeddings_content_hash_idx ON embeddings (content_hash);
+
 -- Create index for vector similarity search
+-- Placeholder built on an empty table; api-bridge's index manager rebuilds it
+-- with lists ~ sqrt(rows) once data arrives (see /api/v1/admin/vector-index)
 CREATE INDEX IF NOT EXISTS embeddings_vector_idx ON embeddings 
 USING ivfflat (embedding vector_cosine_ops)
 WITH (lists = 100);